@@ -6,3 +6,4 @@ rm -rf hyperparams/*
 rm -rf tmp/*
 rm -rf hp/*
 rm -rf figures/*
+rm -rf video/*
@@ -0,0 +1,114 @@
+import os, time, argparse
+import pickle as pk
+from multiprocessing import Pool
+from xml.etree import ElementTree
+
+import numpy as np
+
+from src.headwaysampler import HeadwaySampler
+from src.demandschedule import sine_flow_rates, linear_flow_rates, schedule_fp, save_schedule
+from src.helper_funcs import check_and_make_dir
+
+def parse_cl_args():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("-n", type=int, default=os.cpu_count(), dest='n', help='number of procs generating schedules, default: os.cpu_count()')
+    parser.add_argument("-demand", type=str, default='linear', dest='demand', help='demand schedules to generate, default: linear, options: linear, real, sine, custom, convert (.vg pickles under outdir to compact schedules)')
+    parser.add_argument("-outdir", type=str, default='tf_test/', dest='outdir', help='directory schedules are written to, generated schedules go to its generated/ subdirectory so they never replace the schedules the sims load, default: tf_test/')
+    parser.add_argument("-routefile", type=str, default='networks/single.rou.xml', dest='route_fp', help='sumo route file with the routes vehicles are scheduled on, default: networks/single.rou.xml')
+    parser.add_argument("-cycles", type=int, default=30, dest='cycles', help='number of schedules generated per flow level, default: 30')
+    parser.add_argument("-levels", type=int, nargs='+', default=[1000, 2000, 3000, 4000, 5000], dest='levels', help='linear demand network flow levels (v/h), default: 1000 2000 3000 4000 5000')
+    parser.add_argument("-simlen", type=int, default=3600, dest='sim_len', help='length of generated schedules in seconds, default: 3600')
+    parser.add_argument("-flows", type=str, default='tf_test/real/real.vg', dest='flows_fp', help='real demand: schedule whose measured flow rates are resampled, custom demand: csv of flow rates (v/h) with a column per route and a row per flowres seconds, default: tf_test/real/real.vg')
+    parser.add_argument("-flowres", type=int, default=900, dest='flow_res', help='seconds covered by each flow rate measurement, default: 900')
+    parser.add_argument("-seed", type=int, default=0, dest='seed', help='seed of the first schedule, schedule i uses seed+i, default: 0')
+
+    args = parser.parse_args()
+    return args
+
+def read_routes(route_fp):
+    #route ids vehicles are generated on, same as VehicleGen
+    routes = sorted([r.get('id') for r in ElementTree.parse(route_fp).getroot().iter('route')])
+    return [route for route in routes if route[0]=='r' and route[1].isdigit()]
+
+def measured_flow_rates(start_time_routes, routes, flow_res):
+    #flow rate (v/h) of every route in every second, counted
+    #over the flow_res second period the second falls in
+    end = max([np.max(start_time_routes[r]) for r in routes if len(start_time_routes[r]) > 0])
+    n_periods = int(end//flow_res)+1
+    counts = np.array([np.bincount((np.asarray(start_time_routes[r])//flow_res).astype(np.int64), minlength=n_periods) for r in routes]).T
+    return np.repeat(counts*3600.0/flow_res, flow_res, axis=0)
+
+def gen_schedule(job):
+    fp, flow_rates, routes, seed = job
+    np.random.seed(seed)
+    start_time_routes = HeadwaySampler().schedule(flow_rates)
+    save_schedule(fp, {route:start_times for route, start_times in zip(routes, start_time_routes)})
+    return fp, sum([len(s) for s in start_time_routes])
+
+def convert_schedule(vg_fp):
+    with open(vg_fp, 'rb') as f:
+        start_time_routes = pk.load(f)
+    fp = schedule_fp(vg_fp)
+    save_schedule(fp, start_time_routes)
+    return fp, sum([len(start_time_routes[r]) for r in start_time_routes])
+
+def get_jobs(args):
+    routes = read_routes(args.route_fp)
+    jobs = []
+    #apart from the converted .vg schedules the sims load
+    outdir = os.path.join(args.outdir, 'generated')
+    if args.demand == 'linear':
+        #random split of a constant flow level over the routes
+        rng = np.random.RandomState(args.seed)
+        for level in args.levels:
+            path = os.path.join(outdir, 'linear', str(level))
+            check_and_make_dir(path)
+            for c in range(args.cycles):
+                fp = os.path.join(path, str(level)+'_'+str(c).zfill(2)+'.npy')
+                jobs.append((fp, linear_flow_rates(args.sim_len, level, rng.dirichlet(np.ones(len(routes)))), routes))
+    elif args.demand == 'sine':
+        #randomly shifted sine waves, as in training
+        rng = np.random.RandomState(args.seed)
+        path = os.path.join(outdir, 'sine')
+        check_and_make_dir(path)
+        for c in range(args.cycles):
+            fp = os.path.join(path, 'sine_'+str(c).zfill(2)+'.npy')
+            jobs.append((fp, sine_flow_rates(args.sim_len, len(routes), rng.randint(0, args.sim_len)), routes))
+    elif args.demand == 'real':
+        with open(args.flows_fp, 'rb') as f:
+            start_time_routes = pk.load(f)
+        flow_rates = measured_flow_rates(start_time_routes, routes, args.flow_res)
+        path = os.path.join(outdir, 'real')
+        check_and_make_dir(path)
+        for c in range(args.cycles):
+            jobs.append((os.path.join(path, 'real_'+str(c).zfill(2)+'.npy'), flow_rates, routes))
+    elif args.demand == 'custom':
+        flow_rates = np.atleast_2d(np.loadtxt(args.flows_fp, delimiter=','))
+        assert flow_rates.shape[1] == len(routes), 'Custom flow rates need one column per route, '+str(len(routes))+' routes in '+str(args.route_fp)
+        flow_rates = np.repeat(flow_rates, args.flow_res, axis=0)
+        name = os.path.splitext(os.path.basename(args.flows_fp))[0]
+        path = os.path.join(outdir, 'custom')
+        check_and_make_dir(path)
+        for c in range(args.cycles):
+            jobs.append((os.path.join(path, name+'_'+str(c).zfill(2)+'.npy'), flow_rates, routes))
+    else:
+        #raise not found exceptions
+        assert 0, 'Supplied demand '+str(args.demand)+' does not exist.'
+    return [job+(args.seed+i,) for i, job in enumerate(jobs)]
+
+def main():
+    start_t = time.time()
+    args = parse_cl_args()
+    with Pool(args.n) as pool:
+        if args.demand == 'convert':
+            vg_fps = sorted([os.path.join(d, f) for d, _, fs in os.walk(args.outdir) for f in fs if f[-3:] == '.vg'])
+            results = pool.map(convert_schedule, vg_fps)
+        else:
+            results = pool.map(gen_schedule, get_jobs(args))
+    for fp, n_v in results:
+        print(fp+' '+str(n_v)+' vehicles')
+    print(str(len(results))+' schedules in '+str(time.time()-start_t)+' s')
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,7 @@ from src.graph_globals import global_params
 from src.graphs import graph, boxplot, multi_line, multi_line_with_CI, get_cmap, scatter, save_graph
 from src.picklefuncs import load_data
 from src.helper_funcs import check_and_make_dir
+from src.metricswriter import read_metrics
 
 def main():
     global_params()
@@ -223,6 +224,10 @@ def get_data(fp, metric, read_data_func):
 def get_metric_data(fp):
     #for use with queue and delay data
     #sort all metric data from same tsc_id 
+    runs_fp = os.path.dirname(fp)+'/runs'
+    if not os.path.exists(fp) and os.path.exists(runs_fp):
+        #metrics streamed to one file per run
+        return get_runs_data(runs_fp, os.path.basename(fp))
     if not os.path.exists(fp):
         assert 0, 'Supplied path '+str(fp)+' does not exist.'
 
@@ -243,6 +248,28 @@ def get_metric_data(fp):
 
     return np.stack(sim_runs_data)
 
+def get_runs_data(fp, metric, tsc_id=None):
+    #metric of every streamed run, summed over all
+    #intersections or of the tsc_id intersection
+    data = []
+    for f in sorted(os.listdir(fp)):
+        if f[-5:] != '.json':
+            continue
+        index, run_data = read_metrics(fp+'/'+f[:-5])
+        cols = [ j for j, (t, m) in enumerate(index['columns']) 
+                 if m == metric and (tsc_id is None or t == tsc_id)]
+        data.append( run_data[:,cols].sum(axis=1) )
+    #interrupted runs are shorter
+    n = min([ len(d) for d in data ])
+    return np.stack([ d[:n] for d in data ])
+
+def get_runs_intersections(fp):
+    for f in sorted(os.listdir(fp)):
+        if f[-5:] == '.json':
+            index, _ = read_metrics(fp+'/'+f[:-5])
+            return sorted(set([ t for t, m in index['columns'] ]))
+    return []
+
 def get_folder_data(fp):
     #all the travel times can be
     #grouped together by extending list
@@ -263,7 +290,10 @@ def graph_individual_intersections(labels, colours, fp, metrics, save_dir):
 
     tsc = os.listdir(fp)                          
     tsc.remove('sotl')
-    intersections = os.listdir(fp+tsc[0]+'/'+metrics[0]+'/')
+    if os.path.exists(fp+tsc[0]+'/runs'):
+        intersections = get_runs_intersections(fp+tsc[0]+'/runs')
+    else:
+        intersections = os.listdir(fp+tsc[0]+'/'+metrics[0]+'/')
     ncols = len(intersections)
     nrows = len(metrics)
 
@@ -278,7 +308,10 @@ def graph_individual_intersections(labels, colours, fp, metrics, save_dir):
             data[t] = {}
             for i in intersections:
                 alias_p = 60
-                data[t][i] = alias( stack_folder_files(fp+'/'+t+'/'+m+'/'+i+'/'), alias_p)
+                if os.path.exists(fp+'/'+t+'/runs'):
+                    data[t][i] = alias( get_runs_data(fp+'/'+t+'/runs', m, i), alias_p)
+                else:
+                    data[t][i] = alias( stack_folder_files(fp+'/'+t+'/'+m+'/'+i+'/'), alias_p)
 
         xtitle = 'Time '+r" $(min)$" if r == nrows-1 else ''
         #graph same metric for each intersection
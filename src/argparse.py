@@ -16,9 +16,27 @@ def parse_cl_args():
     parser.add_argument("-tsc", type=str, default='websters', dest='tsc', help='traffic signal control algorithm, default:websters; options:sotl, maxpressure, dqn, ddpg'  )
     parser.add_argument("-simlen", type=int, default=None, dest='sim_len', help='length of simulation in seconds/steps')
     parser.add_argument("-nogui", default=False, action='store_true', dest='nogui', help='disable gui, default: False')
+    parser.add_argument("-libsumo", default=False, action='store_true', dest='libsumo', help='run sumo in process with libsumo instead of connecting with traci over a port, implies -nogui, default: False')
+    parser.add_argument("-record", default=False, action='store_true', dest='record', help='record gui frames and travel time/throughput series in test mode, ignored with -nogui, default: False')
+    parser.add_argument("-recorddir", type=str, default='video/', dest='record_dir', help='dir to write recorded frames and series, default: video/')
+    parser.add_argument("-recordfreq", type=int, default=1, dest='record_freq', help='steps between recorded gui frames, default: 1')
+    parser.add_argument("-nonetcache", default=True, action='store_false', dest='net_cache', help='always parse the net and read traffic lights from a dummy sim instead of loading cached netdata from tmp/netdata/, default: False')
     parser.add_argument("-scale", type=float, default=1.4, dest='scale', help='vehicle generation scale parameter, higher values generates more vehicles, default: 1.0')
-    parser.add_argument("-demand", type=str, default='dynamic', dest='demand', help='vehicle demand generation patter, single limits vehicle network population to one, dynamic creates changing vehicle population, default:dynamic, options:single, dynamic, linear, real')
+    parser.add_argument("-demand", type=str, default='dynamic', dest='demand', help='vehicle demand generation patter, single limits vehicle network population to one, dynamic creates changing vehicle population, default:dynamic, options:single, dynamic, linear (linear_<cycle> or linear_<level>_<cycle>), real')
+    parser.add_argument("-schedule", type=str, default=None, dest='schedule', help='vehicle schedule file vehicles are generated from in place of the -demand schedule, a compact .npy schedule written by gen_demand.py or a .vg pickle, default: None')
 
+    parser.add_argument("-insertwindow", type=int, default=0, dest='insert_window', help='add scheduled vehicles to sumo only this many seconds (s) before they depart instead of all at the start, 0 adds all at the start, compiled route files are read in steps by sumo itself, default: 0')
+    parser.add_argument("-demandseed", type=int, default=None, dest='demand_seed', help='seed vehicle generation of episode e of sim proc i with demandseed+i+n*e for reproducible demand, default: None (random)')
+    parser.add_argument("-compileroutes", default=False, action='store_true', dest='compile_routes', help='write vehicles of demands scheduled at the start (dynamic, linear, real, video) to a route file sumo loads at launch instead of adding them with traci, seeded schedules are reused, default: False')
+    parser.add_argument("-routedir", type=str, default='tmp/routes/', dest='route_dir', help='dir of compiled route files, default: tmp/routes/')
+    parser.add_argument("-statecache", default=False, action='store_true', dest='state_cache', help='save the sim state reached after the start offset and restore it instead of simulating the offset on later runs with the same -demandseed, default: False')
+    parser.add_argument("-statedir", type=str, default='tmp/states/', dest='state_dir', help='dir of cached sim states, default: tmp/states/')
+    parser.add_argument("-delaysource", type=str, default='travel', dest='delay_source', help='delay metric and reward source, travel: time on incoming lanes beyond the free flow travel time, waiting: sumo accumulated waiting time (over --waiting-time-memory), default: travel, options: travel, waiting')
+    parser.add_argument("-metricres", type=int, default=1, dest='metric_res', help='seconds summarized by each stored value of metric histories, default: 1')
+    parser.add_argument("-metrics", type=str, nargs='+', default=None, dest='metrics', help='intersection metrics collected, each name[:steps] with optional steps between samples, e.g. -metrics delay queue:5 co2, controllers add the metrics they need, default: delay in train mode, queue delay in test mode, options: delay, queue, waiting, co2')
+    parser.add_argument("-netmetrics", default=False, action='store_true', dest='net_metrics', help='compute the metrics and throughput of all intersections together in the sim once per step instead of in each controller, network totals are recorded live, default: False')
+    parser.add_argument("-streammetrics", default=False, action='store_true', dest='stream_metrics', help='in test mode write intersection metrics to one file per run in metrics/<tsc>/runs/ while the sim runs instead of one pickle per metric and intersection at the end, default: False')
+    parser.add_argument("-metricschunk", type=int, default=1024, dest='metrics_chunk', help='rows of streamed metrics buffered before they are written, default: 1024')
     parser.add_argument("-offset", type=float, default=0.25, dest='offset', help='max sim offset fraction of total sim length, default: 0.3')
 
     #shared tsc params
@@ -31,6 +49,7 @@ def parse_cl_args():
     parser.add_argument("-cmax", type=int, default=180, dest='c_max', help='maximum cycle time (s), default: 180')
     parser.add_argument("-satflow", type=float, default=0.38, dest='sat_flow', help='lane vehicle saturation rate (veh/s), default: 0.38')
     parser.add_argument("-f", type=int, default=900, dest='update_freq', help='interval over which websters timing are computed (s), default: 900')
+    parser.add_argument("-detectors", default=False, action='store_true', dest='detectors', help='count websters flows with induction loops the sim places at the stop lines, read at phase changes, instead of diffing vehicle data every second, needs a sumo newer than 1.2 with interval detector values in traci, default: False')
 
     #maxpressure params
 
@@ -46,6 +65,7 @@ def parse_cl_args():
     parser.add_argument("-batch", type=int, default=32, dest='batch', help='batch size to sample from replay to train neural net, default: 32')
     parser.add_argument("-gamma", type=float, default=0.99, dest='gamma', help='reward discount factor, default: 0.99')
     parser.add_argument("-updates", type=int, default=10000, dest='updates', help='total number of batch updates for training, default: 10000')
+    parser.add_argument("-batchstate", default=False, action='store_true', dest='batch_state', help='compute the rl states of all intersections in a sim together once per step, default: False')
     parser.add_argument("-target_freq", type=int, default=50, dest='target_freq', help='target network batch update frequency, default: 50')
 
     #neural net params
@@ -0,0 +1,151 @@
+import os
+
+import numpy as np
+
+#shared memory blocks need python 3.8+, without them
+#every proc keeps its own copy of the arrays
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:
+    shared_memory = None
+
+class CompactNetData:
+    """Array form of netdata for the sim and learner procs.
+
+    Lanes and edges get integer ids, numbered in netdata order, and
+    everything read per lane or per edge is kept in numpy arrays. Variable length data uses
+    csr layout, the items of row i are data[offsets[i]:offsets[i+1]].
+
+    After share() all arrays live in one shared memory block, procs
+    forked from the owner use it directly and pickled copies attach
+    to it by name, so each proc only holds the id lists. Where python
+    has no shared memory, share() keeps the arrays as they are.
+    """
+    def __init__(self, netdata):
+        self.lane_ids = list(netdata['lane'].keys())
+        self.edge_ids = list(netdata['edge'].keys())
+        self.index_ids()
+        lane_data, edge_data = netdata['lane'], netdata['edge']
+
+        a = {}
+        a['lane_length'] = np.array([lane_data[l]['length'] for l in self.lane_ids], dtype=np.float64)
+        a['lane_speed'] = np.array([lane_data[l]['speed'] for l in self.lane_ids], dtype=np.float64)
+        #lane length divided by the average vehicle length+stopped headway
+        a['lane_capacity'] = a['lane_length']/7.5
+        a['lane_out_offsets'], a['lane_out'] = self.csr([self.lanes(lane_data[l]['outgoing']) for l in self.lane_ids])
+
+        a['edge_out_offsets'], a['edge_out'] = self.csr([self.edges(edge_data[e]['outgoing']) for e in self.edge_ids])
+
+        self.arrays = a
+        self.shm = None
+        self.layout = None
+        #pid of the proc that created the shared block
+        self.owner = None
+        self.set_attrs()
+
+    def index_ids(self):
+        self.lane_index = {l:i for i, l in enumerate(self.lane_ids)}
+        self.edge_index = {e:i for i, e in enumerate(self.edge_ids)}
+
+    def set_attrs(self):
+        for name in self.arrays:
+            setattr(self, name, self.arrays[name])
+
+    def csr(self, rows, dtype=np.int32):
+        offsets = np.zeros(len(rows)+1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(r) for r in rows])
+        data = np.concatenate(rows).astype(dtype) if len(rows) > 0 else np.zeros(0, dtype=dtype)
+        return offsets, data
+
+    ###id lookups
+    def lanes(self, lane_ids):
+        return np.array([self.lane_index[l] for l in lane_ids], dtype=np.int32)
+
+    def edges(self, edge_ids):
+        return np.array([self.edge_index[e] for e in edge_ids], dtype=np.int32)
+
+    def row(self, name, i):
+        offsets = self.arrays[name+'_offsets']
+        return self.arrays[name][offsets[i]:offsets[i+1]]
+
+    def lane_outgoing(self, lane_id):
+        return [self.lane_ids[l] for l in self.row('lane_out', self.lane_index[lane_id])]
+
+    def edge_outgoing(self, edge_id):
+        return [self.edge_ids[e] for e in self.row('edge_out', self.edge_index[edge_id])]
+
+    ###shared memory
+    def share(self):
+        #copy all arrays into one shared memory block
+        #and replace them with views into it
+        if shared_memory is None:
+            return
+        self.layout = {}
+        size = 0
+        for name, arr in self.arrays.items():
+            #keep every array 8 byte aligned
+            size += (-size) % 8
+            self.layout[name] = (arr.dtype.str, arr.shape, size)
+            size += arr.nbytes
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.owner = os.getpid()
+        arrays = self.attach_arrays()
+        for name in arrays:
+            arrays[name][...] = self.arrays[name]
+        self.arrays = arrays
+        self.set_attrs()
+
+    def attach_arrays(self):
+        return {name:np.ndarray(shape, dtype=np.dtype(dtype), buffer=self.shm.buf, offset=offset)
+                for name, (dtype, shape, offset) in self.layout.items()}
+
+    def __getstate__(self):
+        state = {'lane_ids':self.lane_ids, 'edge_ids':self.edge_ids,
+                 'layout':self.layout}
+        if self.shm is None:
+            state['arrays'] = self.arrays
+        else:
+            state['shm_name'] = self.shm.name
+        return state
+
+    def __setstate__(self, state):
+        self.lane_ids = state['lane_ids']
+        self.edge_ids = state['edge_ids']
+        self.layout = state['layout']
+        self.owner = None
+        self.index_ids()
+        if 'shm_name' in state:
+            self.shm = attach_shared_memory(state['shm_name'])
+            self.arrays = self.attach_arrays()
+        else:
+            self.shm = None
+            self.arrays = state['arrays']
+        self.set_attrs()
+
+    def close(self):
+        #the owner also frees the block, call once all procs are done,
+        #forked procs share the owner attribute but not its pid
+        if self.shm is not None:
+            self.arrays = {}
+            for name in self.layout:
+                setattr(self, name, None)
+            self.shm.close()
+            if self.owner == os.getpid():
+                self.shm.unlink()
+            self.shm = None
+
+def attach_shared_memory(name):
+    #only the owner may unlink the block, python registers attached
+    #blocks with the proc's resource tracker too, which unlinks them
+    #when a proc with its own tracker exits, python 3.13+ can skip
+    #the tracking, before that registering is skipped while attaching,
+    #unregistering would drop the owner's entry from a shared tracker
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
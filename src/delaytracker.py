@@ -0,0 +1,90 @@
+import numpy as np
+
+class DelayTracker:
+    """Incremental delay of the vehicles on incoming lanes, for one
+    or more groups of lanes such as the intersections of a network.
+
+    A vehicle entering a lane is due once its free flow travel time on
+    the lane runs out and is delayed from then on. The delay of a group
+    is n_delayed*t - delayed_due over its delayed vehicles, only the
+    vehicles becoming due or leaving change the aggregates.
+    """
+    def __init__(self, n_groups=1):
+        self.n_groups = n_groups
+        #vehicles on the lanes sorted by interned id, with their
+        #due time, group and the number of the time they were added
+        self.v_ids = np.zeros(0, dtype=np.int32)
+        self.v_due = np.zeros(0)
+        self.v_group = np.zeros(0, dtype=np.int64)
+        self.v_seq = np.zeros(0, dtype=np.int64)
+        self.n_added = 0
+        #not yet delayed vehicles sorted by due time, vehicles that
+        #left stay until their due time and are skipped then
+        self.pending_due = np.zeros(0)
+        self.pending_vid = np.zeros(0, dtype=np.int32)
+        self.pending_seq = np.zeros(0, dtype=np.int64)
+        self.n_delayed = np.zeros(n_groups)
+        self.delayed_due = np.zeros(n_groups)
+        self.t_delayed = -1
+        self.delays = np.zeros(n_groups)
+
+    def get_delays(self, t):
+        #delay of every group at time t
+        if t > self.t_delayed:
+            #vehicles whose due time has passed are delayed from now on
+            k = np.searchsorted(self.pending_due, t, side='right')
+            if k > 0:
+                due, vid = self.pending_due[:k], self.pending_vid[:k]
+                #skip vehicles that left, or left and entered again
+                idx = np.minimum(np.searchsorted(self.v_ids, vid), max(len(self.v_ids)-1, 0))
+                if len(self.v_ids) > 0:
+                    on = (self.v_ids[idx] == vid) & (self.v_seq[idx] == self.pending_seq[:k])
+                else:
+                    on = np.zeros(k, dtype=bool)
+                group = self.v_group[idx[on]]
+                self.n_delayed += np.bincount(group, minlength=self.n_groups)
+                self.delayed_due += np.bincount(group, weights=due[on], minlength=self.n_groups)
+                self.pending_due = self.pending_due[k:]
+                self.pending_vid = self.pending_vid[k:]
+                self.pending_seq = self.pending_seq[k:]
+            self.t_delayed = t
+            self.delays = self.n_delayed*t - self.delayed_due
+        return self.delays
+
+    def add_vehicles(self, ids, due, group=None):
+        #group is the group of every vehicle, the first if None
+        if len(ids) == 0:
+            return
+        if group is None:
+            group = np.zeros(len(ids), dtype=np.int64)
+        seq = np.arange(self.n_added, self.n_added+len(ids))
+        self.n_added += len(ids)
+        order = np.argsort(ids)
+        idx = np.searchsorted(self.v_ids, ids[order])
+        self.v_ids = np.insert(self.v_ids, idx, ids[order])
+        self.v_due = np.insert(self.v_due, idx, due[order])
+        self.v_group = np.insert(self.v_group, idx, group[order])
+        self.v_seq = np.insert(self.v_seq, idx, seq[order])
+        order = np.argsort(due)
+        idx = np.searchsorted(self.pending_due, due[order])
+        self.pending_due = np.insert(self.pending_due, idx, due[order])
+        self.pending_vid = np.insert(self.pending_vid, idx, ids[order])
+        self.pending_seq = np.insert(self.pending_seq, idx, seq[order])
+
+    def remove_vehicles(self, ids):
+        #returns the number of vehicles removed per group
+        if len(ids) == 0 or len(self.v_ids) == 0:
+            return np.zeros(self.n_groups)
+        idx = np.minimum(np.searchsorted(self.v_ids, ids), len(self.v_ids)-1)
+        idx = idx[self.v_ids[idx] == ids]
+        due, group = self.v_due[idx], self.v_group[idx]
+        self.v_ids = np.delete(self.v_ids, idx)
+        self.v_due = np.delete(self.v_due, idx)
+        self.v_group = np.delete(self.v_group, idx)
+        self.v_seq = np.delete(self.v_seq, idx)
+
+        delayed = due <= self.t_delayed
+        self.n_delayed -= np.bincount(group[delayed], minlength=self.n_groups)
+        self.delayed_due -= np.bincount(group[delayed], weights=due[delayed], minlength=self.n_groups)
+        self.delayed_due[self.n_delayed == 0] = 0.0
+        return np.bincount(group, minlength=self.n_groups)
@@ -0,0 +1,53 @@
+import os, json
+
+import numpy as np
+
+#route index and departure time of every scheduled vehicle
+SCHEDULE_DTYPE = np.dtype([('route', np.uint16), ('depart', np.float32)])
+
+SINE_DEMAND_RATIOS = np.array([0.5, 1.5, 1., 0.5, 1.5, 1., 0.5, 1.5, 1., 0.5, 1.5, 1.])
+
+def sine_flow_rates(sim_len, n_routes, random_shift=0):
+    #flow rate (v/h) of every route in every second of a sine wave cycle
+    t = np.linspace(1*np.pi, 2*np.pi, sim_len)
+    sine = 5.1*np.sin(t)+6 # headway 0.9~6s, tf 4000~600vph
+    flow_inputs = 3600/sine
+    flow_inputs = np.concatenate((flow_inputs[random_shift:], flow_inputs[:random_shift]))
+    flow_inputs[-60:] = 0
+    demand_ratios = SINE_DEMAND_RATIOS/SINE_DEMAND_RATIOS.sum()
+    return np.outer(flow_inputs, demand_ratios[:n_routes])
+
+def linear_flow_rates(sim_len, level, ratios):
+    #constant network flow level (v/h) split over the routes by ratios
+    ratios = np.asarray(ratios, dtype=np.float64)
+    return np.outer(np.full(sim_len, float(level)), ratios/ratios.sum())
+
+def schedule_fp(fp):
+    #compact schedule file stored next to a .vg pickle
+    return os.path.splitext(fp)[0]+'.npy'
+
+def save_schedule(fp, start_time_routes):
+    """write a {route:departure times} schedule as a structured array
+    grouped by route, departures keep their order in the schedule,
+    the route names go to a json index next to it with the number
+    of vehicles of each route
+    """
+    routes = list(start_time_routes.keys())
+    assert len(routes) <= np.iinfo(SCHEDULE_DTYPE['route']).max, 'Too many routes for a compact schedule: '+str(len(routes))
+    counts = [len(start_time_routes[r]) for r in routes]
+    schedule = np.zeros(sum(counts), dtype=SCHEDULE_DTYPE)
+    schedule['route'] = np.repeat(np.arange(len(routes)), counts)
+    if len(schedule) > 0:
+        schedule['depart'] = np.concatenate([np.asarray(start_time_routes[r], dtype=np.float64) for r in routes])
+    np.save(fp, schedule)
+    with open(os.path.splitext(fp)[0]+'.json', 'w') as f:
+        json.dump({'routes':routes, 'counts':counts}, f)
+
+def load_schedule(fp):
+    #memory map a compact schedule, each route's departure
+    #times are a view into the mapped array
+    with open(os.path.splitext(fp)[0]+'.json', 'r') as f:
+        index = json.load(f)
+    departs = np.load(fp, mmap_mode='r')['depart']
+    offsets = np.concatenate(([0], np.cumsum(index['counts'], dtype=np.int64)))
+    return {r:departs[offsets[i]:offsets[i+1]] for i, r in enumerate(index['routes'])}
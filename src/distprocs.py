@@ -1,5 +1,6 @@
 import sys, os, subprocess, time
 from multiprocessing import *
+from xml.etree import ElementTree
 
 from tensorflow.python.framework.ops import disable_eager_execution
 
@@ -7,6 +8,9 @@ from src.simproc import SimProc
 from src.learnerproc import LearnerProc
 from src.networkdata import NetworkData
 from src.sumosim import SumoSim
+from src.compactnetdata import CompactNetData
+from src.picklefuncs import save_data, load_data
+from src.helper_funcs import check_and_make_dir, hash_files
 
 import numpy as np
 
@@ -61,16 +65,14 @@ class DistProcs:
 
         barrier = Barrier(args.n+args.l)
 
-        nd = NetworkData(args.net_fp)
-        netdata = nd.get_net_data()
+        netdata = self.get_netdata(args)
 
-        #create a dummy sim to get tsc data for creating nn
-        #print('creating dummy sim for netdata...')
-        sim = SumoSim(args.cfg_fp, args.sim_len, args.tsc, True, netdata, args, -1)
-        sim.gen_sim()
-        netdata = sim.update_netdata()
-        sim.close()
-        #print('...finished with dummy sim')
+        #procs get the per intersection data and the rest
+        #of the net as arrays in one shared memory block
+        self.compact = CompactNetData(netdata)
+        self.compact.share()
+        netdata = {'inter':netdata['inter'], 'origin':netdata['origin'],
+                   'destination':netdata['destination'], 'compact':self.compact}
 
         tsc_ids = netdata['inter'].keys()
 
@@ -112,9 +114,37 @@ class DistProcs:
         ###join when finished
         for p in self.procs:
             p.join()
+        self.compact.close()
 
         print('...finishing all processes')
 
+    def get_netdata(self, args):
+        #netdata only depends on the sumo input files and the
+        #scenario, it is cached so later runs skip parsing
+        #the net and launching a sumo to read the traffic lights
+        fp = 'tmp/netdata/'+get_netdata_key(args)+'.p'
+        if args.net_cache and os.path.isfile(fp):
+            print('loading cached netdata '+fp)
+            return load_data(fp)
+
+        nd = NetworkData(args.net_fp)
+        netdata = nd.get_net_data()
+
+        #create a dummy sim to get tsc data for creating nn
+        #print('creating dummy sim for netdata...')
+        sim = SumoSim(args.cfg_fp, args.sim_len, args.tsc, True, netdata, args, -1)
+        sim.gen_sim()
+        netdata = sim.update_netdata()
+        sim.close()
+        #print('...finished with dummy sim')
+
+        if args.net_cache:
+            check_and_make_dir('tmp/netdata/')
+            #write then rename, concurrent runs never read half a file
+            save_data(fp+'.'+str(os.getpid()), netdata)
+            os.replace(fp+'.'+str(os.getpid()), fp)
+        return netdata
+
     def create_mp_stats_dict(self, tsc_ids):
         ###use this mp shared dict for data between procs
         manager = Manager()
@@ -166,3 +196,14 @@ class DistProcs:
             return [0]*n_actors
         elif mode == 'train':
             return np.linspace(0, simlen*offset, num = n_actors) 
+
+def get_netdata_key(args):
+    #hash of the scenario and the sumo input files netdata is
+    #read from, the net, cfg and its route and additional files
+    fps = [args.net_fp, args.cfg_fp]
+    cfg = ElementTree.parse(args.cfg_fp).getroot()
+    cfg_dir = os.path.dirname(args.cfg_fp)
+    for option in ['route-files', 'additional-files']:
+        for e in cfg.iter(option):
+            fps += [os.path.join(cfg_dir, f.strip()) for f in e.get('value').split(',') if f.strip()]
+    return hash_files(fps, str(args.sim))
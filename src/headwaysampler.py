@@ -0,0 +1,102 @@
+import numpy as np
+from scipy.stats import johnsonsb
+from scipy.stats import johnsonsu
+
+F_RATES = [60., 200., 500., 800., 1100., 1400., 1700.] # typical flow rates (v/h) with headway distribution models
+
+class HeadwaySampler:
+    """Samples vehicle headways (s) for arrays of flow rates (v/h).
+
+    Each typical flow rate has a fitted johnson headway distribution,
+    headways for flow rates in between are interpolated from the two
+    neighbouring distributions. Variates are drawn in bulk into a pool
+    per distribution and handed out from there.
+    """
+    def __init__(self, pool_size=4096, random_state=None):
+        self.dists = [johnsonsb(0.3, 1.8, loc=0.85, scale=130),
+                      johnsonsb(0.9, 0.71, loc=0.85, scale=60),
+                      johnsonsb(2.49, 0.71, loc=0.85, scale=104.57),
+                      johnsonsb(3.71, 0.98, loc=0.85, scale=104.57),
+                      johnsonsu(-2.18, 1.15, loc=0.8, scale=0.52),
+                      johnsonsu(-2.54, 1.31, loc=0.47, scale=0.46),
+                      johnsonsu(-2.49, 1.49, loc=0.55, scale=0.49)]
+        self.pool_size = pool_size
+        self.random_state = random_state
+        self.pools = [np.zeros(0) for _ in self.dists]
+        self.pos = [0 for _ in self.dists]
+
+    def draw(self, k, n):
+        #n variates of distribution k
+        if self.pos[k]+n > len(self.pools[k]):
+            rest = self.pools[k][self.pos[k]:]
+            new = self.dists[k].rvs(size=max(self.pool_size, n), random_state=self.random_state)
+            self.pools[k] = np.concatenate([rest, new])
+            self.pos[k] = 0
+        h = self.pools[k][self.pos[k]:self.pos[k]+n]
+        self.pos[k] += n
+        return h
+
+    def sample(self, flow_rates):
+        flow_rates = np.asarray(flow_rates, dtype=np.float64)
+        assert np.all(flow_rates >= F_RATES[0]/2), f'Input flow rate ({flow_rates.min()}) should not be smaller than {F_RATES[0]/2}v/h for calculating the headway!'
+        #flow rates in (F_RATES[i-1], F_RATES[i]] are in band i,
+        #band 0 is at most F_RATES[0], the last band above F_RATES[-1]
+        band = np.searchsorted(F_RATES, flow_rates, side='left')
+        n = len(F_RATES)
+        headways = np.zeros(len(flow_rates))
+        for i in range(n+1):
+            idx = np.flatnonzero(band == i)
+            if len(idx) == 0:
+                continue
+            f = flow_rates[idx]
+            if i == 0:
+                # headyway should be smaller than 900s, which is the normal measure period of traffic flow
+                headways[idx] = np.minimum(900, self.draw(0, len(idx)) * F_RATES[0] / f)
+            elif i == n:
+                # headyway should be bigger than 0
+                headways[idx] = np.maximum(self.draw(n-1, len(idx)) * F_RATES[-1] / f, 0)
+            else:
+                ratio = (f-F_RATES[i-1])/(F_RATES[i]-F_RATES[i-1])
+                h = (1-ratio) * self.draw(i-1, len(idx)) + ratio * self.draw(i, len(idx))
+                headways[idx] = np.maximum(h, 0)
+        return headways
+
+    def schedule(self, flow_rates):
+        """departure times for a (seconds x routes) array of flow rates,
+        returns one array of departure times per route
+
+        A route's next vehicle departs one headway, sampled for the flow
+        rate in the second of its last departure, after its last vehicle.
+        Seconds with a flow rate below F_RATES[0] start no headway. All
+        routes are advanced together, one vehicle each per pass.
+        """
+        T, n_routes = flow_rates.shape
+        #next second at or after t with flow to generate vehicles, T if none
+        valid = np.where(flow_rates >= F_RATES[0], np.arange(T)[:,np.newaxis], T)
+        next_valid = np.full((T+1, n_routes), T)
+        next_valid[:T] = np.minimum.accumulate(valid[::-1], axis=0)[::-1]
+
+        routes = np.arange(n_routes)
+        t_generate = next_valid[0].copy()
+        last = np.full(n_routes, np.nan)
+        departs, depart_routes = [], []
+        active = routes[t_generate < T]
+        while len(active) > 0:
+            t = t_generate[active]
+            h = self.sample(flow_rates[t, active])
+            #first vehicle of a route departs a headway after its first second
+            start = np.where(np.isnan(last[active]), t, last[active]) + h
+            last[active] = start
+            departs.append(start)
+            depart_routes.append(active)
+            t_generate[active] = next_valid[np.minimum(np.round(start).astype(np.int64), T), active]
+            active = active[t_generate[active] < T]
+
+        if len(departs) == 0:
+            return [np.zeros(0) for _ in routes]
+        departs = np.concatenate(departs)
+        depart_routes = np.concatenate(depart_routes)
+        #stable sort keeps each route's departures in order
+        order = np.argsort(depart_routes, kind='stable')
+        counts = np.bincount(depart_routes, minlength=n_routes)
+        return np.split(departs[order], np.cumsum(counts)[:-1])
@@ -1,4 +1,4 @@
-import os, datetime
+import os, datetime, hashlib
 
 def check_and_make_dir(path):
     if not os.path.isdir(path):
@@ -27,3 +27,11 @@ def write_to_log(s):
     fp += 'log.txt'
     t = get_time_now()
     write_line_to_file(fp, 'a+', t+':: '+s)
+
+def hash_files(fps, prefix=''):
+    #sha1 hex digest of a prefix and the contents of files
+    h = hashlib.sha1(prefix.encode())
+    for fp in fps:
+        with open(fp, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
@@ -0,0 +1,54 @@
+import numpy as np
+
+class MetricHistory:
+    """Time series of a metric in a preallocated float32 array.
+
+    With res > 1 every stored value summarizes res consecutive
+    samples, their mean, or for cumulative series the last sample.
+    The array is sized for length samples and doubles if more come.
+    Without keep only the latest sample and window are held. Samples
+    are arrays of the given shape, scalars by default.
+    """
+    def __init__(self, length=0, res=1, cumulative=False, keep=True, shape=()):
+        assert res >= 1, 'Metric history resolution should be at least 1, got '+str(res)
+        self.res = int(res)
+        self.cumulative = cumulative
+        self.keep = keep
+        if not keep:
+            length = 0
+        self.values = np.zeros((-(-int(length)//self.res)+1,)+tuple(shape), dtype=np.float32)
+        self.n = 0
+        self.last = 0.0
+        #samples of the window not stored yet
+        self.acc = 0.0
+        self.k = 0
+
+    def append(self, x):
+        self.last = x
+        if self.cumulative:
+            self.acc = x
+        else:
+            self.acc = self.acc + x
+        self.k += 1
+        if self.k == self.res:
+            self.values[self.n] = self.window_value()
+            self.acc = 0.0
+            self.k = 0
+            if not self.keep:
+                return
+            self.n += 1
+            if self.n == len(self.values):
+                self.values = np.concatenate((self.values, np.zeros_like(self.values)))
+
+    def window_value(self):
+        return self.acc if self.cumulative else self.acc/self.k
+
+    def get(self):
+        #view of the stored values, with the partial last window
+        if self.k > 0:
+            self.values[self.n] = self.window_value()
+            return self.values[:self.n+1]
+        return self.values[:self.n]
+
+    def __len__(self):
+        return self.n + (1 if self.k > 0 else 0)
@@ -0,0 +1,59 @@
+import json
+
+import numpy as np
+
+class MetricsWriter:
+    """Streams the metrics of every intersection in a sim run to
+    one file while the sim runs.
+
+    Each row holds one value per (intersection, metric) column, rows
+    are buffered and appended to fp.f32 a chunk at a time, the column
+    order is in the json index fp.json. Every complete chunk is on
+    disk, so an interrupted run still leaves its data up to there.
+    """
+    def __init__(self, fp, columns, chunk=1024, res=1):
+        self.columns = [list(c) for c in columns]
+        self.res = int(res)
+        self.buf = np.zeros((chunk, len(self.columns)), dtype=np.float32)
+        self.n = 0
+        #samples of the current row when downsampling
+        self.acc = np.zeros(len(self.columns))
+        self.k = 0
+        with open(fp+'.json', 'w') as f:
+            json.dump({'columns':self.columns, 'dtype':'float32', 'res':self.res}, f)
+        self.f = open(fp+'.f32', 'wb')
+
+    def append(self, row):
+        self.acc += row
+        self.k += 1
+        if self.k == self.res:
+            self.add_row()
+
+    def add_row(self):
+        self.buf[self.n] = self.acc/self.k
+        self.acc[:] = 0.0
+        self.k = 0
+        self.n += 1
+        if self.n == len(self.buf):
+            self.flush()
+
+    def flush(self):
+        self.buf[:self.n].tofile(self.f)
+        self.f.flush()
+        self.n = 0
+
+    def close(self):
+        if self.k > 0:
+            self.add_row()
+        self.flush()
+        self.f.close()
+
+def read_metrics(fp):
+    #column index and (time x column) data of a streamed run,
+    #a partially written last row is dropped
+    with open(fp+'.json', 'r') as f:
+        index = json.load(f)
+    data = np.fromfile(fp+'.f32', dtype=np.dtype(index['dtype']))
+    n_cols = len(index['columns'])
+    n_rows = len(data)//n_cols if n_cols > 0 else 0
+    return index, data[:n_rows*n_cols].reshape(n_rows, n_cols)
@@ -1,44 +1,84 @@
-import sys, subprocess, os
-import inspect
-
-if 'SUMO_HOME' in os.environ:
-    tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
-    sys.path.append(tools)
-    import sumolib
-else:
-    sys.exit("please declare environment variable 'SUMO_HOME'")
-'''
-# we need to import python modules from the $SUMO_HOME/tools directory
-try:
-    sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..', "tools")) # tutorial in tests
-    sys.path.append(os.path.join(os.environ.get("SUMO_HOME", os.path.join(os.path.dirname(__file__), "..", "..", "..")), "tools")) # tutorial in docs
-    #from sumolib import checkBinary
-    import sumolib
-except ImportError:
-    sys.exit("please declare environment variable 'SUMO_HOME' as the root directory of your sumo installation (it should contain folders 'bin', 'tools' and 'docs')")
-'''
+from xml.etree import ElementTree
 
 import numpy as np
 
 class NetworkData:
+    """Reads the edges, lanes, nodes and traffic light intersections
+    of a sumo .net.xml file.
+
+    The file is streamed once, keeping only the attributes used here,
+    so time and memory grow with the size of the net file. Internal,
+    crossing, walkingarea and connector edges are skipped the same
+    way sumolib.net.readNet skips them by default.
+    """
     def __init__(self, net_fp):
-        print(net_fp) 
-        self.net = sumolib.net.readNet(net_fp)
+        print(net_fp)
+        self.read_net(net_fp)
         ###get edge data
-        self.edge_data = self.get_edge_data(self.net)
-        self.lane_data = self.get_lane_data(self.net)
-        self.node_data, self.intersection_data = self.get_node_data(self.net)
+        self.edge_data = self.get_edge_data()
+        self.lane_data = self.get_lane_data()
+        self.node_data, self.intersection_data = self.get_node_data()
         print("SUCCESSFULLY GENERATED NET DATA")
 
     def get_net_data(self):
         return {'lane':self.lane_data, 'edge':self.edge_data, 'origin':self.find_origin_edges(), 'destination':self.find_destination_edges(), 'node':self.node_data, 'inter':self.intersection_data}
 
+    def read_net(self, net_fp):
+        #edges and lanes in file order, node ids in
+        #the order sumolib creates nodes
+        self.edges = {}
+        self.lanes = {}
+        self.nodes = {}
+        #connections, (from edge, from lane, to edge, to lane, dir, tls link index)
+        self.conns = []
+        skipped_edges = set()
+        edge = None
+        root = None
+        for event, elem in ElementTree.iterparse(net_fp, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                elif elem.tag == 'edge':
+                    if elem.get('function', '') == '':
+                        edge = elem.get('id')
+                        self.edges[edge] = {'from':elem.get('from'), 'to':elem.get('to'), 'lanes':[]}
+                        self.add_node(elem.get('from'))
+                        self.add_node(elem.get('to'))
+                    else:
+                        edge = None
+                        skipped_edges.add(elem.get('id'))
+                elif elem.tag == 'lane' and edge is not None:
+                    lane = elem.get('id')
+                    self.edges[edge]['lanes'].append(lane)
+                    self.lanes[lane] = {'edge':edge, 'length':float(elem.get('length')), 'speed':float(elem.get('speed'))}
+                elif elem.tag == 'junction' and elem.get('id')[0] != ':':
+                    node = self.add_node(elem.get('id'))
+                    if node['type'] is None:
+                        node['type'] = elem.get('type')
+                        node['x'] = float(elem.get('x'))
+                        node['y'] = float(elem.get('y'))
+                elif elem.tag == 'connection':
+                    from_edge, to_edge = elem.get('from'), elem.get('to')
+                    if from_edge[0] != ':' and from_edge not in skipped_edges and to_edge not in skipped_edges:
+                        tl = elem.get('tl', '')
+                        self.conns.append((from_edge, int(elem.get('fromLane')),
+                                           to_edge, int(elem.get('toLane')),
+                                           elem.get('dir'), int(elem.get('linkIndex')) if tl != '' else -1))
+            elif elem.tag in ('edge', 'junction', 'connection'):
+                #free finished top level elements
+                root.clear()
+
+    def add_node(self, node_id):
+        if node_id not in self.nodes:
+            self.nodes[node_id] = {'type':None, 'x':None, 'y':None}
+        return self.nodes[node_id]
+
     def find_destination_edges(self):
         next_edges = { e:0 for e in self.edge_data }
         for e in self.edge_data:
             for next_e in self.edge_data[e]['incoming']:
                 next_edges[next_e] += 1
-                                                                 
+
         destinations = [ e for e in next_edges if next_edges[e] == 0]
         return destinations
 
@@ -51,81 +91,84 @@ class NetworkData:
         origins = [ e for e in next_edges if next_edges[e] == 0]
         return origins
 
-    def get_edge_data(self, net):
-        edges = net.getEdges()
-        edge_data = {str(edge.getID()):{} for edge in edges} 
-
-        for edge in edges:
-            edge_ID = str(edge.getID())
-            edge_data[edge_ID]['lanes'] = [str(lane.getID()) for lane in edge.getLanes()]
-            edge_data[edge_ID]['length'] = float(edge.getLength())
-            edge_data[edge_ID]['outgoing'] = [str(out.getID()) for out in edge.getOutgoing()]
+    def get_edge_data(self):
+        edge_data = {edge_ID:{} for edge_ID in self.edges}
+        #neighbouring edges in the order of their first connection
+        outgoing = {edge_ID:{} for edge_ID in self.edges}
+        incoming = {edge_ID:{} for edge_ID in self.edges}
+        for c in self.conns:
+            outgoing[c[0]][c[2]] = None
+            incoming[c[2]][c[0]] = None
+
+        for edge_ID in self.edges:
+            edge = self.edges[edge_ID]
+            edge_data[edge_ID]['lanes'] = list(edge['lanes'])
+            edge_data[edge_ID]['length'] = self.lanes[edge['lanes'][0]]['length']
+            edge_data[edge_ID]['outgoing'] = list(outgoing[edge_ID])
             edge_data[edge_ID]['noutgoing'] = len(edge_data[edge_ID]['outgoing'])
             edge_data[edge_ID]['nlanes'] = len(edge_data[edge_ID]['lanes'])
-            edge_data[edge_ID]['incoming'] = [str(inc.getID()) for inc in edge.getIncoming()]
-            edge_data[edge_ID]['outnode'] = str(edge.getFromNode().getID())
-            edge_data[edge_ID]['incnode'] = str(edge.getToNode().getID())
-            edge_data[edge_ID]['speed'] = float(edge.getSpeed())
-          
+            edge_data[edge_ID]['incoming'] = list(incoming[edge_ID])
+            edge_data[edge_ID]['outnode'] = edge['from']
+            edge_data[edge_ID]['incnode'] = edge['to']
+            #edge speed is the speed of its last lane
+            edge_data[edge_ID]['speed'] = self.lanes[edge['lanes'][-1]]['speed']
+
             ###coords for each edge
-            incnode_coord = edge.getFromNode().getCoord()
-            outnode_coord = edge.getToNode().getCoord()
-            edge_data[edge_ID]['coord'] = np.array([incnode_coord[0], incnode_coord[1], outnode_coord[0], outnode_coord[1]]).reshape(2,2)
-            #print edge_data[edge_ID]['coord']
-        return edge_data 
-
-    def get_lane_data(self, net):
-        #create lane objects from lane_ids
-        lane_ids = []
-        for edge in self.edge_data:
-            lane_ids.extend(self.edge_data[edge]['lanes'])
+            incnode = self.nodes[edge['from']]
+            outnode = self.nodes[edge['to']]
+            edge_data[edge_ID]['coord'] = np.array([incnode['x'], incnode['y'], outnode['x'], outnode['y']]).reshape(2,2)
+        return edge_data
 
-        lanes = [net.getLane(lane) for lane in lane_ids]
+    def get_lane_data(self):
         #lane data dict
-        lane_data = {lane:{} for lane in lane_ids}
-
-        for lane in lanes:
-            lane_id = lane.getID()
-            lane_data[ lane_id ]['length'] = lane.getLength()
-            lane_data[ lane_id ]['speed'] = lane.getSpeed()
-            lane_data[ lane_id ]['edge'] = str(lane.getEdge().getID())
-            #lane_data[ lane_id ]['outgoing'] = []
-            lane_data[ lane_id ]['outgoing'] = {}
-            ###.getOutgoing() returns a Connection type, which we use to determine the next lane
-            moveid = []
-            for conn in lane.getOutgoing():
-                out_id = str(conn.getToLane().getID())
-                lane_data[ lane_id ]['outgoing'][out_id] = {'dir':str(conn.getDirection()), 'index':conn.getTLLinkIndex()}
-                moveid.append(str(conn.getDirection()))
-            lane_data[ lane_id ]['movement'] = ''.join(sorted(moveid))
-            #create empty list for incoming lanes 
-            lane_data[ lane_id ]['incoming'] = []
-               
-        #determine incoming lanes using outgoing lanes data
+        lane_data = {}
+        for edge in self.edge_data:
+            for lane_id in self.edge_data[edge]['lanes']:
+                lane = self.lanes[lane_id]
+                lane_data[ lane_id ] = {'length':lane['length'], 'speed':lane['speed'], 'edge':lane['edge'],
+                                        'outgoing':{}, 'movement':[], 'incoming':[]}
+
+        ###connections determine the next lanes
+        for c in self.conns:
+            lane_id = self.edges[c[0]]['lanes'][c[1]]
+            out_id = self.edges[c[2]]['lanes'][c[3]]
+            lane_data[ lane_id ]['outgoing'][out_id] = {'dir':c[4], 'index':c[5]}
+            lane_data[ lane_id ]['movement'].append(c[4])
+        for lane_id in lane_data:
+            lane_data[ lane_id ]['movement'] = ''.join(sorted(lane_data[ lane_id ]['movement']))
+
+        #determine incoming lanes from outgoing lanes in one pass
         for lane in lane_data:
-            for inc in lane_data:
-                if lane == inc:
-                    continue
-                else:
-                    if inc in lane_data[lane]['outgoing']:
-                        lane_data[inc]['incoming'].append(lane)
+            for out in lane_data[lane]['outgoing']:
+                if out != lane:
+                    lane_data[out]['incoming'].append(lane)
 
         return lane_data
 
-
-    def get_node_data(self, net):
-        #read network from .netfile
-        nodes = net.getNodes()
-        node_data = {node.getID():{} for node in nodes}
-
-        for node in nodes:
-            node_id = node.getID()
-            #get incoming/outgoing edge
-            node_data[node_id]['incoming'] = set(str(edge.getID()) for edge in node.getIncoming())
-            node_data[node_id]['outgoing'] = set(str(edge.getID()) for edge in node.getOutgoing())
-            node_data[node_id]['tlsindex'] = { conn.getTLLinkIndex():str(conn.getFromLane().getID()) for conn in node.getConnections()}
-            node_data[node_id]['tlsindexdir'] = { conn.getTLLinkIndex():str(conn.getDirection()) for conn in node.getConnections()}
-
+    def get_node_data(self):
+        node_data = {node_id:{} for node_id in self.nodes}
+        for node_id in node_data:
+            node_data[node_id]['incoming'] = set()
+            node_data[node_id]['outgoing'] = set()
+            node_data[node_id]['tlsindex'] = {}
+            node_data[node_id]['tlsindexdir'] = {}
+        for edge_ID in self.edges:
+            node_data[self.edges[edge_ID]['from']]['outgoing'].add(edge_ID)
+            node_data[self.edges[edge_ID]['to']]['incoming'].add(edge_ID)
+
+        #tls link indices of the connections leaving each incoming
+        #lane, visited by incoming edge, lane and connection order
+        lane_conns = {lane_id:[] for lane_id in self.lanes}
+        for c in self.conns:
+            lane_conns[self.edges[c[0]]['lanes'][c[1]]].append(c)
+        for edge_ID in self.edges:
+            node_id = self.edges[edge_ID]['to']
+            for lane_id in self.edges[edge_ID]['lanes']:
+                for c in lane_conns[lane_id]:
+                    node_data[node_id]['tlsindex'][c[5]] = lane_id
+                    node_data[node_id]['tlsindexdir'][c[5]] = c[4]
+
+        for node_id in node_data:
             if node_id == '-13968':
                 missing = []
                 negative = []
@@ -136,19 +179,18 @@ class NetworkData:
                 for k in node_data[node_id]['tlsindex']:
                     if k < 0  :
                         negative.append(k)
-              
+
                 for m,n in zip(missing, negative):
                     node_data[node_id]['tlsindex'][m] = node_data[node_id]['tlsindex'][n]
                     del node_data[node_id]['tlsindex'][n]
                     #for index dir
                     node_data[node_id]['tlsindexdir'][m] = node_data[node_id]['tlsindexdir'][n]
                     del node_data[node_id]['tlsindexdir'][n]
-            
+
             #get XY coords
-            pos = node.getCoord()
-            node_data[node_id]['x'] = pos[0]
-            node_data[node_id]['y'] = pos[1]
+            node_data[node_id]['x'] = self.nodes[node_id]['x']
+            node_data[node_id]['y'] = self.nodes[node_id]['y']
 
-        intersection_data = {str(node):node_data[node] for node in node_data if "traffic_light" in net.getNode(node).getType()} 
+        intersection_data = {str(node):node_data[node] for node in node_data if "traffic_light" in self.nodes[node]['type']}
 
         return node_data, intersection_data
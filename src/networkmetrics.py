@@ -0,0 +1,127 @@
+import numpy as np
+
+from src.metrichistory import MetricHistory
+from src.trafficmetrics import METRICS, parse_metric_args
+from src.delaytracker import DelayTracker
+
+class NetworkMetrics:
+    """Registered metrics and throughput of all intersections,
+    computed together from the sim vehicle snapshot once per step.
+
+    Every snapshot lane is the incoming lane of at most one
+    intersection, so each lane metric is a per lane reduction grouped
+    by the intersection index of the lane. Delay is maintained from the
+    vehicles entering and leaving lanes by one DelayTracker grouped by
+    intersection, as DelayMetric does for a single intersection. Histories have a column per
+    intersection and a last column with the network total.
+    """
+    def __init__(self, tsc_ids, incoming_idx, lane_travel_times, metrics, mode, length, res=1, keep=True, delay_source='travel'):
+        self.tsc_ids = list(tsc_ids)
+        self.index = {t:i for i, t in enumerate(self.tsc_ids)}
+        n = len(self.tsc_ids)
+        #intersection of every snapshot lane, -1 if no incoming lane
+        self.lane_inter = np.full(len(lane_travel_times), -1, dtype=np.int64)
+        for t in self.tsc_ids:
+            self.lane_inter[incoming_idx[t]] = self.index[t]
+        self.inc_lanes = np.flatnonzero(self.lane_inter >= 0)
+        self.lane_travel_times = lane_travel_times
+        #{name:steps between samples}
+        self.metrics = parse_metric_args(metrics)
+        self.mode = mode
+
+        #delay of the vehicles on the incoming lanes of each intersection
+        self.delay = DelayTracker(n)
+        #accumulated waiting time per intersection, used as
+        #delay if waiting, the sim then subscribes it from sumo
+        self.waiting = delay_source == 'waiting'
+        self.waits = np.zeros(n)
+        self.tracking = False
+        self.t = 0
+
+        #current values of the lane metrics
+        self.values = {m:np.zeros(n) for m in self.metrics if m != 'delay'}
+        self.throughput_last = np.zeros(n)
+        self.histories = {}
+        if mode == 'test':
+            self.histories = {m:MetricHistory(length, res, keep=keep, shape=(n+1,)) for m in self.metrics}
+        self.throughput = MetricHistory(length, res, cumulative=True, keep=keep, shape=(n+1,))
+
+    def get_delays(self):
+        if self.waiting:
+            return self.waits
+        return self.delay.get_delays(self.t)
+
+    def get_metric(self, metric):
+        #current value of every intersection
+        if metric == 'delay':
+            return self.get_delays()
+        elif metric == 'throughput':
+            return self.throughput_last
+        elif metric in self.values:
+            return self.values[metric]
+        #raise not found exceptions
+        assert 0, 'Supplied network metric '+str(metric)+' does not exist.'
+
+    def get_network(self, metric):
+        return self.get_metric(metric).sum()
+
+    def get_history(self, metric):
+        return self.histories[metric].get()
+
+    def group(self, lane_values):
+        #sum per lane values over the incoming lanes of each intersection
+        return np.bincount(self.lane_inter[self.inc_lanes], weights=lane_values[self.inc_lanes],
+                           minlength=len(self.tsc_ids))
+
+    def with_total(self, x):
+        return np.append(x, x.sum())
+
+    def update(self, v_data):
+        if self.mode == 'test' and 'delay' in self.metrics:
+            self.histories['delay'].append(self.with_total(self.get_delays()))
+
+        lane_inter = self.lane_inter
+        if self.waiting:
+            self.waits = self.group(v_data.lane_sums('wait'))
+
+        if self.tracking:
+            #only vehicles that changed lane since the last step
+            rows = np.flatnonzero(v_data.entered)
+            rows = rows[lane_inter[v_data.lane[rows]] >= 0]
+            left_inter = lane_inter[v_data.left_lane]
+            left = v_data.left_vid[left_inter >= 0]
+            left_inter = left_inter[left_inter >= 0]
+        else:
+            #first step, every vehicle on the incoming lanes is new
+            rows = np.flatnonzero(lane_inter[v_data.lane] >= 0)
+            left = np.zeros(0, dtype=np.int32)
+            left_inter = np.zeros(0, dtype=np.int64)
+            self.tracking = True
+        entered = v_data.vid[rows]
+        entered_lanes = v_data.lane[rows]
+        entered_inter = lane_inter[entered_lanes]
+
+        if len(left) > 0 and len(entered) > 0:
+            #vehicles changing between incoming lanes of
+            #the same intersection keep their due time
+            order = np.argsort(left)
+            pos = np.minimum(np.searchsorted(left[order], entered), len(left)-1)
+            stay = (left[order][pos] == entered) & (left_inter[order][pos] == entered_inter)
+            if stay.any():
+                keep = np.ones(len(left), dtype=bool)
+                keep[order[pos[stay]]] = False
+                left, left_inter = left[keep], left_inter[keep]
+                entered, entered_lanes, entered_inter = entered[~stay], entered_lanes[~stay], entered_inter[~stay]
+
+        #vehicles that have left incoming lanes
+        self.throughput_last += self.delay.remove_vehicles(left)
+        #record when new vehicles start being delayed
+        self.delay.add_vehicles(entered, self.t+self.lane_travel_times[entered_lanes], entered_inter)
+
+        for m in self.values:
+            if self.t % self.metrics[m] == 0:
+                self.values[m] = self.group(METRICS[m].lane_values(v_data))
+                if self.mode == 'test':
+                    self.histories[m].append(self.with_total(self.values[m]))
+        self.throughput.append(self.with_total(self.throughput_last))
+        self.t += 1
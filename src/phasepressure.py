@@ -0,0 +1,77 @@
+import numpy as np
+
+class PhasePressure:
+    """Max pressure of every green phase of an intersection as a
+    matrix vector product on the vehicle counts of its lanes.
+
+    Row p of the incidence matrix is +1 on the incoming and -1 on
+    the outgoing lanes of phase p, a second matrix marks all lanes of
+    a phase to tell phases without any vehicles apart.
+    """
+    def __init__(self, inc_idx, out_idx):
+        #inc_idx and out_idx are lists of snapshot lane index
+        #arrays, one per phase in the controller's phase order
+        self.n_phases = len(inc_idx)
+        self.lanes = np.unique(np.concatenate(list(inc_idx)+list(out_idx)).astype(np.int64))
+        col = {l:j for j, l in enumerate(self.lanes)}
+        self.incidence = np.zeros((self.n_phases, len(self.lanes)), dtype=np.int64)
+        self.occupied = np.zeros((self.n_phases, len(self.lanes)), dtype=np.int64)
+        for p in range(self.n_phases):
+            inc = [col[l] for l in np.unique(inc_idx[p])]
+            out = [col[l] for l in np.unique(out_idx[p])]
+            self.incidence[p, inc] += 1
+            self.incidence[p, out] -= 1
+            self.occupied[p, inc+out] = 1
+        #set when the sim batches the pressures of all intersections
+        self.batch = None
+        self.row = None
+
+    def pressure(self, snapshot):
+        #pressure of every phase and number of vehicles on its lanes
+        if self.batch is not None:
+            return self.batch.get_rows(snapshot, self.row)
+        counts = snapshot.counts[self.lanes]
+        return self.incidence.dot(counts), self.occupied.dot(counts)
+
+class BatchPhasePressure:
+    """Phase pressures of all max pressure intersections in a sim,
+    one block sparse product over the snapshot lane counts computed
+    the first time any intersection decides in a step.
+    """
+    def __init__(self, pressures):
+        #pressures is a dict of PhasePressure keyed by tsc id
+        tsc_ids = sorted(pressures.keys())
+        self.tsc_ids = tsc_ids
+        n_phases = np.array([pressures[t].n_phases for t in tsc_ids], dtype=np.int64)
+        self.offsets = np.zeros(len(tsc_ids)+1, dtype=np.int64)
+        np.cumsum(n_phases, out=self.offsets[1:])
+        #nonzero entries of the block diagonal matrices, rows are
+        #phases of all intersections, columns snapshot lanes
+        rows, cols, vals, occ = [], [], [], []
+        for i, t in enumerate(tsc_ids):
+            pp = pressures[t]
+            p, j = np.nonzero(pp.occupied)
+            rows.append(p+self.offsets[i])
+            cols.append(pp.lanes[j])
+            vals.append(pp.incidence[p, j])
+            occ.append(pp.occupied[p, j])
+            pp.batch = self
+            pp.row = i
+        self.rows = np.concatenate(rows)
+        self.cols = np.concatenate(cols)
+        self.vals = np.concatenate(vals)
+        self.occ = np.concatenate(occ)
+        self.n = int(self.offsets[-1])
+        self.snapshot = None
+
+    def pressure_all(self, snapshot):
+        counts = snapshot.counts[self.cols]
+        self.pressures = np.bincount(self.rows, weights=self.vals*counts, minlength=self.n)
+        self.vehicles = np.bincount(self.rows, weights=self.occ*counts, minlength=self.n)
+        self.snapshot = snapshot
+
+    def get_rows(self, snapshot, row):
+        if snapshot is not self.snapshot:
+            self.pressure_all(snapshot)
+        s = slice(self.offsets[row], self.offsets[row+1])
+        return self.pressures[s], self.vehicles[s]
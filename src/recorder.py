@@ -0,0 +1,74 @@
+import os, threading, queue
+
+import numpy as np
+
+from src.helper_funcs import check_and_make_dir
+
+class Recorder:
+    """Records gui frames and time series of a sim run.
+
+    Frames are rendered and written by sumo-gui itself, so only the
+    screenshot request is issued from the sim loop. Time series samples
+    are handed to a background thread through a bounded queue, the
+    thread buffers them and periodically appends the new samples of
+    each series to out_dir/<name>.f32, see read_series.
+    """
+    def __init__(self, conn, out_dir, frame_freq=1, flush_freq=300, max_queue=1024):
+        self.conn = conn
+        self.out_dir = out_dir if out_dir.endswith('/') else out_dir+'/'
+        check_and_make_dir(self.out_dir)
+        self.frame_freq = frame_freq
+        self.flush_freq = flush_freq
+        self.n_frames = 0
+        self.t = 0
+        #samples not written yet, and series written before
+        self.series = {}
+        self.written = set()
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+
+    def frame(self):
+        #request a screenshot every frame_freq steps
+        if self.t % self.frame_freq == 0:
+            self.conn.gui.screenshot("View #0", self.out_dir+str(self.n_frames)+".jpg")
+            self.n_frames += 1
+        self.t += 1
+
+    def record(self, name, value):
+        #blocks only if the writer falls max_queue samples behind
+        self.queue.put((name, value))
+
+    def write_loop(self):
+        n = 0
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            name, value = item
+            if name not in self.series:
+                self.series[name] = []
+            self.series[name].append(value)
+            n += 1
+            if n % self.flush_freq == 0:
+                self.flush()
+        self.flush()
+
+    def flush(self):
+        #only the samples since the last flush are written
+        for name in self.series:
+            if len(self.series[name]) > 0:
+                #a new recorder replaces series of earlier runs
+                mode = 'ab' if name in self.written else 'wb'
+                with open(self.out_dir+name+'.f32', mode) as f:
+                    np.asarray(self.series[name], dtype=np.float32).tofile(f)
+                self.series[name] = []
+                self.written.add(name)
+
+    def close(self):
+        self.queue.put(None)
+        self.writer.join()
+
+def read_series(out_dir, name):
+    #all samples of a recorded series
+    return np.fromfile(os.path.join(out_dir, name+'.f32'), dtype=np.float32)
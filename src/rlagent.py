@@ -24,8 +24,10 @@ class RLAgent:
         ### here we append to a temporary experience sequence/trajectory buffer, 
         #and when terminal or steps length, at to experience replay
         if self.rl_stats['updates'] < self.updates:
-            experience = {'s':state, 'a':action,                                     
-                          'next_s':next_state, 'r':reward, 'terminal':terminal}
+            #states are views of reused state buffers, copy
+            #them as trajectories outlive the next decisions
+            experience = {'s':np.copy(state), 'a':action,                                     
+                          'next_s':np.copy(next_state), 'r':reward, 'terminal':terminal}
                                                                                      
             #append experience to trajectory
             self.experience_trajectory.append(experience)
@@ -0,0 +1,70 @@
+import numpy as np
+
+class RouteTable:
+    """Every route a uniform random walk from an origin edge can take
+    to a destination edge, with the probability the walk takes it.
+
+    Routes are registered with sumo once per sim, a vehicle is then
+    added on a sampled route with a single call. Origins whose walks
+    can loop, hit a dead end or have more than max_paths routes have
+    no table and keep being routed by walking per vehicle.
+    """
+    def __init__(self, compact, origins, destinations, max_paths=1000):
+        self.compact = compact
+        self.destinations = set(destinations)
+        self.max_paths = max_paths
+        self.routes = {}
+        self.cum_probs = {}
+        for origin in origins:
+            paths = self.enumerate_paths(origin)
+            if paths is None:
+                continue
+            routes, probs = paths
+            self.routes[origin] = routes
+            cum_probs = np.cumsum(probs)
+            #guard against rounding, the walk always ends somewhere
+            cum_probs[-1] = 1.0
+            self.cum_probs[origin] = cum_probs
+
+    def enumerate_paths(self, origin):
+        routes, probs = [], []
+        stack = [([origin], 1.0)]
+        n_expanded = 0
+        while stack:
+            path, p = stack.pop()
+            e = path[-1]
+            if e in self.destinations:
+                routes.append(path)
+                probs.append(p)
+                if len(routes) > self.max_paths:
+                    return None
+                continue
+            n_expanded += 1
+            if n_expanded > 10*self.max_paths:
+                return None
+            outgoing = self.compact.edge_outgoing(e)
+            if len(outgoing) == 0:
+                return None
+            for o in outgoing:
+                if o in path:
+                    return None
+                stack.append((path+[o], p/len(outgoing)))
+        return routes, probs
+
+    def route_id(self, origin, k):
+        return 'rt_'+origin+'_'+str(k)
+
+    def has_routes(self, origin):
+        return origin in self.routes
+
+    def add_routes(self, conn, existing=()):
+        existing = set(existing)
+        for origin in self.routes:
+            for k, route in enumerate(self.routes[origin]):
+                route_id = self.route_id(origin, k)
+                if route_id not in existing:
+                    conn.route.add(route_id, route)
+
+    def sample(self, origin, rng=np.random):
+        k = np.searchsorted(self.cum_probs[origin], rng.random_sample(), side='right')
+        return self.route_id(origin, min(k, len(self.routes[origin])-1))
@@ -0,0 +1,32 @@
+import numpy as np
+
+class RunningStats:
+    """Running mean and standard deviation (Welford), updated in
+    constant time per sample without keeping the samples.
+
+    Optionally also counts samples in fixed width bins
+    over [0, hist_max), larger samples go in the last bin.
+    """
+    def __init__(self, hist_width=None, hist_max=None):
+        self.n = 0
+        self._mean = 0.0
+        self.m2 = 0.0
+        self.hist = None
+        if hist_width:
+            self.hist_width = hist_width
+            self.hist = np.zeros(int(np.ceil(hist_max/hist_width)), dtype=np.int64)
+
+    def update(self, x):
+        self.n += 1
+        delta = x - self._mean
+        self._mean += delta/self.n
+        self.m2 += delta*(x - self._mean)
+        if self.hist is not None:
+            self.hist[min(int(x/self.hist_width), len(self.hist)-1)] += 1
+
+    def mean(self):
+        return self._mean
+
+    def std(self):
+        #population std, same as np.std
+        return np.sqrt(self.m2/self.n) if self.n > 0 else 0.0
@@ -55,12 +55,13 @@ class SimProc(Process):
         #barrier
 
         if self.args.mode == 'train':
+            #the same sumo process is reloaded for every episode
             while not self.finished_updates():
                 self.run_sim(neural_networks)
                 if (self.eps == 1.0 or self.eps < 0.02):
                     self.write_to_csv(self.sim.sim_stats())
                 #self.write_travel_times()
-                self.sim.close()
+            self.sim.close()
 
         elif self.args.mode == 'test':
             print(str(self.idx)+' test  waiting at offset ------------- '+str(self.offset))
@@ -68,13 +69,13 @@ class SimProc(Process):
             self.initial = False
             #just run one sim for stats
             self.run_sim(neural_networks)
+            self.sim.close()
             if (self.eps == 1.0 or self.eps < 0.02) and self.args.mode == 'test':
                 self.write_to_csv(self.sim.sim_stats())
                 with open( str(self.eps)+'.csv','a+') as f:
                     f.write('-----------------\n')
             self.write_sim_tsc_metrics()
             #self.write_travel_times()
-            self.sim.close()
         print('------------------\nFinished on sim process '+str(self.idx)+' Closing\n---------------')
 
     def run_sim(self, neural_networks):
@@ -84,7 +85,7 @@ class SimProc(Process):
         if self.initial is True:
             #if the initial sim, run until the offset time reached
             self.initial = False
-            self.sim.run_offset(self.offset)
+            self.sim.warm_start(self.offset)
             print(str(self.idx)+' train  waiting at offset ------------- '+str(self.offset)+' at '+str(get_time_now()))
             write_to_log(' ACTOR #'+str(self.idx)+' FINISHED RUNNING OFFSET '+str(self.offset)+' to time '+str(self.sim.t)+' , WAITING FOR OTHER OFFSETS...')
             self.barrier.wait()
@@ -108,6 +109,9 @@ class SimProc(Process):
         #write all metrics to correct path
         #path = 'metrics/'+str(self.args.tsc)
         path = 'metrics/'+str(self.args.tsc) 
+        #streamed metrics were written by the sim as it ran
+        if self.args.stream_metrics:
+            tsc_metrics = {}
         for tsc in tsc_metrics:
             for m in tsc_metrics[tsc]:
                 mpath = path + '/'+str(m)+'/'+str(tsc)+'/'
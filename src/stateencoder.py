@@ -0,0 +1,68 @@
+import numpy as np
+
+class StateEncoder:
+    """Writes an intersection's rl state into preallocated float32 buffers.
+
+    The state is the normalized density and queue of the incoming
+    lanes followed by a one hot encoding of a phase. Two buffers are
+    used in turn, so the state returned by the previous call stays
+    valid until it is stored as an experience at the next decision.
+    """
+    def __init__(self, lane_capacity, phases, stop_speed=0.3):
+        self.n_lanes = len(lane_capacity)
+        self.inv_capacity = (1.0/np.asarray(lane_capacity)).astype(np.float32)
+        self.phase_to_int = {p:i for i, p in enumerate(phases)}
+        self.state_d = 2*self.n_lanes + len(phases)
+        self.stop_speed = stop_speed
+        self.buffers = np.zeros((2, self.state_d), dtype=np.float32)
+        self.b = 0
+        #set when the sim batches the states of all intersections
+        self.batch = None
+        self.row = None
+
+    def encode(self, snapshot, incoming_idx, phase):
+        self.b = 1 - self.b
+        state = self.buffers[self.b]
+        n = self.n_lanes
+        if self.batch is not None:
+            state[:2*n] = self.batch.get_row(snapshot, self.row)
+        else:
+            np.multiply(snapshot.counts[incoming_idx], self.inv_capacity, out=state[:n], casting='unsafe')
+            np.multiply(snapshot.lane_queues(self.stop_speed)[incoming_idx], self.inv_capacity, out=state[n:2*n], casting='unsafe')
+        state[2*n:] = 0.0
+        state[2*n+self.phase_to_int[phase]] = 1.0
+        return state
+
+class BatchStateEncoder:
+    """Normalized density and queue of all rl intersections in a sim,
+    computed in one pass as an (n_tsc, max state_d) matrix the first
+    time any intersection asks for its state in a step.
+    """
+    def __init__(self, encoders, incoming_idx):
+        #encoders and incoming_idx are dicts keyed by tsc id
+        tsc_ids = sorted(encoders.keys())
+        self.tsc_ids = tsc_ids
+        self.n_lanes = np.array([encoders[t].n_lanes for t in tsc_ids])
+        self.states = np.zeros((len(tsc_ids), 2*self.n_lanes.max()), dtype=np.float32)
+        #flat gather/scatter indices over all intersections' lanes
+        self.lane_idx = np.concatenate([incoming_idx[t] for t in tsc_ids]).astype(np.int64)
+        self.inv_capacity = np.concatenate([encoders[t].inv_capacity for t in tsc_ids])
+        self.rows = np.repeat(np.arange(len(tsc_ids)), self.n_lanes)
+        self.cols = np.concatenate([np.arange(n) for n in self.n_lanes]).astype(np.int64)
+        self.stop_speed = encoders[tsc_ids[0]].stop_speed
+        self.snapshot = None
+        for row, t in enumerate(tsc_ids):
+            encoders[t].batch = self
+            encoders[t].row = row
+
+    def encode_all(self, snapshot):
+        density = snapshot.counts[self.lane_idx]*self.inv_capacity
+        queue = snapshot.lane_queues(self.stop_speed)[self.lane_idx]*self.inv_capacity
+        self.states[self.rows, self.cols] = density
+        self.states[self.rows, self.cols+self.n_lanes[self.rows]] = queue
+        self.snapshot = snapshot
+
+    def get_row(self, snapshot, row):
+        if snapshot is not self.snapshot:
+            self.encode_all(snapshot)
+        return self.states[row, :2*self.n_lanes[row]]
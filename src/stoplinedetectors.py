@@ -0,0 +1,30 @@
+from src.helper_funcs import write_lines_to_file
+
+#distance (m) of the induction loops before the stop line
+STOPLINE_OFFSET = 0.1
+
+def detector_id(lane):
+    #id of the induction loop at the stop line of a lane
+    return 'stopline_'+lane
+
+def write_stopline_detectors(fp, lanes, lane_lengths, freq, out_fp):
+    """write an additional file with an induction loop at the stop
+    line of every lane, the aggregation interval freq (s) spans the
+    whole run so the interval vehicle number of a loop counts all
+    vehicles that have passed it, the aggregated output goes to
+    out_fp and is not read
+    """
+    lines = ['<additional>']
+    lines += ['    <inductionLoop id="%s" lane="%s" pos="%.2f" freq="%d" file="%s" friendlyPos="true"/>'
+              % (detector_id(l), l, max(length-STOPLINE_OFFSET, 0.0), freq, out_fp) for l, length in zip(lanes, lane_lengths)]
+    lines += ['</additional>']
+    write_lines_to_file(fp, 'w', lines)
+
+def check_detector_counts(conn, lane):
+    #interval detector values are only in newer sumo versions
+    #than the sumo 1.2 this framework was written for
+    try:
+        conn.inductionloop.getIntervalVehicleNumber(detector_id(lane))
+    except Exception as e:
+        assert 0, ('-detectors reads interval vehicle numbers of induction loops, which '
+                   +str(conn.getVersion()[1])+' does not support, update sumo or run websters without -detectors: '+str(e))
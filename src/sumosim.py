@@ -9,58 +9,184 @@ else:
 
 import traci
 import numpy as np
-import pickle
+from xml.etree import ElementTree
+try:
+    #in process sumo, optional, same api as traci
+    import libsumo
+except ImportError:
+    libsumo = None
 
-from src.trafficsignalcontroller import TrafficSignalController
+from src.trafficsignalcontroller import get_phase_lanes
 from src.tsc_factory import tsc_factory
 from src.vehiclegen import VehicleGen
-from src.helper_funcs import write_to_log
+from src.routetable import RouteTable
+from src.vehiclesnapshot import VehicleSnapshot
+from src.stateencoder import BatchStateEncoder
+from src.recorder import Recorder
+from src.runningstats import RunningStats
+from src.metrichistory import MetricHistory
+from src.metricswriter import MetricsWriter
+from src.networkmetrics import NetworkMetrics
+from src.trafficmetrics import metric_columns
+from src.phasepressure import BatchPhasePressure
+from src.stoplinedetectors import write_stopline_detectors, check_detector_counts
+from src.picklefuncs import save_data, load_data
+from src.helper_funcs import write_to_log, check_and_make_dir, get_time_now, hash_files
 
 STEP_LEN_SIMU = 1.0 #0.5# 0.2 # simulation step length in second
 assert (1.0/STEP_LEN_SIMU).is_integer(), "Agent basic step length 1 second should be divisible by simulator step length."
 n_steps_second = int(1.0/STEP_LEN_SIMU)
+#sumo variable of every vehicle snapshot column
+SNAPSHOT_VARS = {'pos':traci.constants.VAR_LANEPOSITION,
+                 'speed':traci.constants.VAR_SPEED,
+                 'wait':traci.constants.VAR_ACCUMULATED_WAITING_TIME,
+                 'co2':traci.constants.VAR_CO2EMISSION}
+#lateral distance (m) from a lane's shape within which
+#its context subscription collects vehicles
+LANE_CONTEXT_RANGE = 1.0
 
 class SumoSim:
     def __init__(self, cfg_fp, sim_len, tsc, nogui, netdata, args, idx):
         self.cfg_fp = cfg_fp
         self.sim_len = sim_len
         self.tsc = tsc
+        self.libsumo = args.libsumo
+        if self.libsumo and not nogui:
+            print('libsumo backend has no gui, running sumo without gui')
+            nogui = True
+        self.gui = not nogui
         self.sumo_cmd = 'sumo' if nogui else 'sumo-gui' 
         self.netdata = netdata
         self.args = args
         self.idx = idx
-        self.n_screenshot = 0
-        self.tt_mean_second = [] # mean travel time till now for each second
-        self.tt_std_second = [] # std travel time till now for each second
-        
+        #counted up by gen_sim, seeded demand differs per episode
+        self.episode = -1
+        #sumo is started by the first gen_sim and
+        #reused for every following episode until close
+        self.conn = None
+        self.sumo_process = None
+        #random walk routes of single vehicle demand, built once per net
+        self.route_table = None
+        self.metrics_writer = None
+        self.network_metrics = None
+        #snapshot columns subscribed, set once the controllers exist
+        self.vehicle_columns = []
+
 
     def gen_sim(self):
         #create sim stuff and intersections
-        #serverless_connect()
-        #self.conn, self.sumo_process = self.server_connect()
-
-        port = self.args.port+self.idx
+        self.episode += 1
         sumoBinary = checkBinary(self.sumo_cmd)
-        port = self.args.port+self.idx
-        self.sumo_process = subprocess.Popen([sumoBinary, "-c",
-                                         self.cfg_fp, "--step-length", str(STEP_LEN_SIMU), "--remote-port",
-                                         str(port), "--no-warnings",
-                                         "--no-step-log", "--random"],
-                                         stdout=None, stderr=None)
-
-        self.conn = traci.connect(port)
+        sumo_args = [sumoBinary, "-c", self.cfg_fp, 
+                     "--step-length", str(STEP_LEN_SIMU),
+                     "--no-warnings", "--no-step-log", "--random"]
+        route_fp = None
+        #the dummy sim (idx -1) only reads the traffic lights,
+        #it never runs vehicles and compiles no route file
+        if self.args.compile_routes and self.idx >= 0 and (self.args.sim == 'double' or self.args.sim == 'single'):
+            route_fp = self.compile_routes()
+        if route_fp:
+            #given route files replace the cfg's, keep its routes
+            sumo_args += ["--route-files", ','.join(self.get_cfg_files('route-files')+[route_fp])]
+        if self.args.tsc == 'websters' and self.args.detectors and 'compact' in self.netdata:
+            #websters counts flows with loops at the stop lines
+            sumo_args += ["--additional-files", ','.join(self.get_cfg_files('additional-files')+[self.write_detectors()])]
+        if self.conn is not None:
+            #keep the running sumo for the next episode, loading
+            #restarts the sim and clears routes and subscriptions
+            self.conn.load(sumo_args[1:])
+        elif self.libsumo:
+            #run sumo inside this process, the libsumo module
+            #exposes the same domains as a traci connection
+            assert libsumo is not None, 'libsumo backend requested but libsumo could not be imported, check SUMO_HOME/tools'
+            libsumo.start(sumo_args)
+            self.conn = libsumo
+            self.sumo_process = None
+        else:
+            port = self.args.port+self.idx
+            self.sumo_process = subprocess.Popen(sumo_args+["--remote-port", str(port)],
+                                                 stdout=None, stderr=None)
+            self.conn = traci.connect(port)
 
         self.t = 0
         self.v_start_times = {}
-        self.v_travel_times = {}
+        #travel times are summarized in constant memory, individual
+        #travel times are only kept in test mode to write results
+        self.tt_stats = RunningStats()
+        self.travel_times = [] if self.args.mode == 'test' else None
+        self.tt_mean_second = MetricHistory(self.sim_len, self.args.metric_res) # mean travel time till now for each second
+        self.tt_std_second = MetricHistory(self.sim_len, self.args.metric_res) # std travel time till now for each second
+        #vehicle ids are interned to ints when first seen
+        self.v_intern = {}
+        self.lane_idx = {}
+        #lane of every interned vehicle in the previous snapshot
+        self.v_lane = np.zeros(0, dtype=np.int32)
+        self.prev_snapshot = None
+        #gui frames and time series are only recorded on request
+        #in gui test runs, written off the sim loop by a thread
+        self.recorder = None
+        if self.args.record and self.gui and self.args.mode == 'test':
+            self.recorder = Recorder(self.conn, self.args.record_dir, self.args.record_freq)
         self.vehiclegen = None
         if self.args.sim == 'double' or self.args.sim == 'single':
+            if self.args.demand == 'single' and self.route_table is None and 'compact' in self.netdata:
+                self.route_table = RouteTable(self.netdata['compact'], self.netdata['origin'], self.netdata['destination'])
             self.vehiclegen = VehicleGen(self.netdata, 
                                          self.args.sim_len, 
                                          self.args.demand, 
                                          self.args.scale,
-                                         self.args.mode, self.conn) 
+                                         self.args.mode, self.conn,
+                                         self.demand_seed(), self.gui,
+                                         compiled=route_fp is not None,
+                                         window=self.args.insert_window,
+                                         route_table=self.route_table,
+                                         schedule=self.args.schedule) 
+
+
+    def compile_routes(self):
+        #write the vehicles of demands scheduled up front to a route
+        #file sumo loads at launch, seeded schedules are reused
+        seed = self.demand_seed()
+        if seed is None:
+            fp = self.args.route_dir+'rand_'+str(self.idx)+'.rou.xml'
+        else:
+            name = [str(self.args.sim), self.demand_name(), self.args.mode, str(self.args.scale),
+                    str(self.args.sim_len), str(seed)]
+            fp = self.args.route_dir+'_'.join(name)+'.rou.xml'
+            if os.path.isfile(fp):
+                return fp
+        #no connection yet, read the route ids from the cfg's route files
+        routes = []
+        for route_file in self.get_cfg_files('route-files'):
+            routes += [r.get('id') for r in ElementTree.parse(route_file).getroot().iter('route')]
+        vehiclegen = VehicleGen(self.netdata, self.args.sim_len, self.args.demand, self.args.scale,
+                                self.args.mode, None, seed, routes=sorted(routes), schedule=self.args.schedule)
+        if vehiclegen.gen_schedule is None:
+            return None
+        check_and_make_dir(self.args.route_dir)
+        vehiclegen.write_route_file(fp)
+        return fp
 
+    def write_detectors(self):
+        #induction loops at the stop lines of all controlled incoming lanes
+        fp = 'tmp/detectors_'+str(self.idx)+'.add.xml'
+        #sumo writes the loops' aggregated output, absolute
+        #since sumo resolves it relative to the additional file
+        out_fp = os.path.abspath('tmp/detectors_'+str(self.idx)+'.out.xml')
+        check_and_make_dir('tmp/')
+        lanes = sorted(set([l for t in self.netdata['inter'] for l in self.netdata['inter'][t]['incoming_lanes']]))
+        lane_lengths = self.netdata['compact'].lane_length[self.netdata['compact'].lanes(lanes)]
+        write_stopline_detectors(fp, lanes, lane_lengths, self.sim_len+1, out_fp)
+        return fp
+
+    def get_cfg_files(self, option):
+        #files of a sumocfg input option, relative to the cwd
+        cfg = ElementTree.parse(self.cfg_fp).getroot()
+        cfg_dir = os.path.dirname(self.cfg_fp)
+        fps = []
+        for e in cfg.iter(option):
+            fps += [os.path.join(cfg_dir, f.strip()) for f in e.get('value').split(',') if f.strip()]
+        return fps
 
     def get_traffic_lights(self):
         #find all the junctions with traffic lights
@@ -69,12 +195,16 @@ class SumoSim:
 
         tl_juncs = set(trafficlights).intersection( set(junctions) )
         tls = []
+        self.tl_green_phases = {}
+
+        #subscription to get traffic light phases, all
+        #definitions are fetched together after subscribing
+        for tl in tl_juncs:
+            self.conn.trafficlight.subscribe(tl, [traci.constants.TL_COMPLETE_DEFINITION_RYG])
+        tldata = self.conn.trafficlight.getAllSubscriptionResults()
      
         #only keep traffic lights with more than 1 green phase
         for tl in tl_juncs:
-            #subscription to get traffic light phases
-            self.conn.trafficlight.subscribe(tl, [traci.constants.TL_COMPLETE_DEFINITION_RYG])
-            tldata = self.conn.trafficlight.getAllSubscriptionResults()
             logic = tldata[tl][traci.constants.TL_COMPLETE_DEFINITION_RYG][0]
 
             #for some reason this throws errors for me in SUMO 1.2
@@ -88,6 +218,8 @@ class SumoSim:
                              and ('G' in p.state or 'g' in p.state) ]
             if len(green_phases) > 1:
                 tls.append(tl)
+                #sorted like the controllers sort them
+                self.tl_green_phases[tl] = sorted(green_phases)
 
         #for some reason these intersections cause problems with tensorflow
         #I have no idea why, it doesn't make any sense, if you don't believe me 
@@ -107,15 +239,85 @@ class SumoSim:
         #create traffic signal controllers for the junctions with lights
         self.tsc = { tl:tsc_factory(self.args.tsc, tl, self.args, self.netdata, rl_stats[tl], exp_replays[tl], neural_networks[tl], eps, self.conn)  
                      for tl in self.tl_junc }
+        if self.args.tsc == 'websters' and self.args.detectors and 'compact' in self.netdata:
+            #fail early on sumo versions without interval detector values
+            if len(self.tsc) > 0:
+                t = sorted(self.tsc)[0]
+                check_detector_counts(self.conn, self.tsc[t].incoming_lanes[0])
+        #the recorder records the throughput of every intersection
+        for t in self.tsc:
+            self.tsc[t].set_metric_args(self.args.metrics, self.args.delay_source, self.recorder is not None)
+        #only subscribe the vehicle variables some controller or metric
+        #reads, delay can be read from sumo's accumulated waiting time
+        columns = set()
+        for t in self.tsc:
+            columns.update(self.tsc[t].vehicle_columns)
+            columns.update(metric_columns(self.tsc[t].metric_args))
+        if self.args.delay_source == 'waiting':
+            columns.add('wait')
+        self.vehicle_columns = [c for c in SNAPSHOT_VARS if c in columns]
+        #only keep snapshot data for lanes some controller reads,
+        #each of these lanes is a row index into the snapshot
+        data_lanes = set()
+        for t in self.tsc:
+            data_lanes.update(self.tsc[t].data_lanes)
+        self.lane_idx = {l:i for i, l in enumerate(sorted(data_lanes))}
+        self.subscribe_lanes()
+        #streamed metrics are not also kept in memory
+        stream = self.args.stream_metrics and self.args.mode == 'test'
+        length = self.sim_len-self.t
+        for t in self.tsc:
+            self.tsc[t].index_lanes(self.lane_idx)
+        self.network_metrics = None
+        if self.args.net_metrics:
+            self.create_network_metrics(length, not stream)
+        else:
+            for t in self.tsc:
+                self.tsc[t].trafficmetrics.init_histories(length, self.args.metric_res, keep=not stream)
+        self.metrics_writer = None
+        if stream:
+            self.create_metrics_writer(eps)
+        #optionally encode rl states of all intersections in one pass
+        encoders = {t:self.tsc[t].state_encoder for t in self.tsc if self.tsc[t].state_encoder is not None}
+        if self.args.batch_state and len(encoders) > 0:
+            BatchStateEncoder(encoders, {t:self.tsc[t].incoming_idx for t in encoders})
+        #max pressure of all intersections in one product
+        pressures = {t:self.tsc[t].phase_pressure for t in self.tsc if self.tsc[t].phase_pressure is not None}
+        if len(pressures) > 1:
+            BatchPhasePressure(pressures)
+
+    def create_network_metrics(self, length, keep):
+        #metrics of all intersections computed by the sim in one pass
+        tsc_ids = sorted(self.tsc)
+        metrics = {}
+        for t in tsc_ids:
+            metrics.update(self.tsc[t].trafficmetrics.freqs)
+        compact = self.netdata['compact']
+        lanes = compact.lanes(sorted(self.lane_idx, key=self.lane_idx.get))
+        lane_travel_times = compact.lane_length[lanes]/compact.lane_speed[lanes]
+        self.network_metrics = NetworkMetrics(tsc_ids, {t:self.tsc[t].incoming_idx for t in tsc_ids},
+                                              lane_travel_times, metrics, self.args.mode,
+                                              length, self.args.metric_res, keep, self.args.delay_source)
+        for i, t in enumerate(tsc_ids):
+            self.tsc[t].trafficmetrics.use_network(self.network_metrics, i)
+
+    def create_metrics_writer(self, eps):
+        #one file per run with a column per intersection and metric
+        path = 'metrics/'+str(self.args.tsc)+'/runs/'
+        check_and_make_dir(path)
+        self.metric_columns = [(t, m) for t in sorted(self.tsc) for m in self.tsc[t].metric_args]
+        self.metrics_writer = MetricsWriter(path+get_time_now()+'_'+str(eps), self.metric_columns,
+                                            self.args.metrics_chunk, self.args.metric_res)
 
     def update_netdata(self):
+        #green phases and incoming lanes as the controllers
+        #derive them, without having to create controllers
         tl_junc = self.get_traffic_lights()
-        tsc = { tl:TrafficSignalController(self.conn, tl, self.args.mode, self.netdata, 2, 3)  
-                     for tl in tl_junc }
-
-        for t in tsc:
-            self.netdata['inter'][t]['incoming_lanes'] = tsc[t].incoming_lanes
-            self.netdata['inter'][t]['green_phases'] = tsc[t].green_phases
+        for t in tl_junc:
+            green_phases = self.tl_green_phases[t]
+            phase_lanes = get_phase_lanes(self.netdata, t, green_phases)
+            self.netdata['inter'][t]['incoming_lanes'] = sorted(set([l for p in phase_lanes for l in phase_lanes[p]]))
+            self.netdata['inter'][t]['green_phases'] = green_phases
 
         all_intersections = set(self.netdata['inter'].keys())
         #only keep intersections that we want to control
@@ -125,21 +327,15 @@ class SumoSim:
         return self.netdata
 
     def sim_step(self):
-        self.tt_mean_second += [np.mean(list(self.v_travel_times.values()))]
-        self.tt_std_second += [np.std(list(self.v_travel_times.values()))]
-        if self.t>1199:
-            file = open("/home/yan/work_spaces/tsc-rl/video/tt_mean.data", 'wb')
-            print(f'$$$$$$ tt_mean length is: {len(self.tt_mean_second)}')
-            pickle.dump(self.tt_mean_second, file)
-            file.close()
-            file = open("/home/yan/work_spaces/tsc-rl/video/tt_std.data", 'wb')
-            print(f'$$$$$$ tt_std length is: {len(self.tt_std_second)}')
-            pickle.dump(self.tt_std_second, file)
-            file.close()
+        tt_mean, tt_std = self.tt_stats.mean(), self.tt_stats.std()
+        self.tt_mean_second.append(tt_mean)
+        self.tt_std_second.append(tt_std)
+        if self.recorder:
+            self.recorder.record('tt_mean', tt_mean)
+            self.recorder.record('tt_std', tt_std)
         for _ in range(n_steps_second):
-            self.conn.gui.screenshot("View #0", "/home/yan/work_spaces/tsc-rl/video/"+str(self.n_screenshot)+".jpg")
-            #print(f'$$$$$$$$$$ has view: {self.conn.gui.hasView("View #0")}')
-            self.n_screenshot += 1
+            if self.recorder:
+                self.recorder.frame()
             self.conn.simulationStep()
         self.t += 1
 
@@ -151,6 +347,66 @@ class SumoSim:
             self.update_travel_times()
             self.sim_step()
 
+    def demand_name(self):
+        #vehicles from a schedule file only depend on its content
+        if self.args.schedule is not None:
+            fps = [self.args.schedule]
+            if self.args.schedule[-4:] == '.npy':
+                #route names are in the json index
+                fps.append(os.path.splitext(self.args.schedule)[0]+'.json')
+            return 'schedule-'+hash_files(fps)[:12]
+        return str(self.args.demand)
+
+    def demand_seed(self):
+        if self.args.demand_seed is None:
+            return None
+        #unique over the sim procs and their episodes
+        return self.args.demand_seed+max(self.idx, 0)+self.args.n*self.episode
+
+    def warm_start(self, offset):
+        #restore the state reached after simulating the offset
+        #if it was cached before, otherwise simulate and cache it,
+        #unseeded demand differs every run so it is never cached
+        if not self.args.state_cache or self.demand_seed() is None:
+            self.run_offset(offset)
+            return
+        fp = self.state_fp(offset)
+        if os.path.isfile(fp+'.p'):
+            self.load_state(fp)
+        else:
+            self.run_offset(offset)
+            self.save_state(fp)
+
+    def state_fp(self, offset):
+        #states are only interchangeable for the same scenario,
+        #sumo input files, demand and offset, the demand also
+        #depends on the sim length, mode and insertion window
+        fps = [self.args.net_fp, self.cfg_fp]+self.get_cfg_files('route-files')+self.get_cfg_files('additional-files')
+        name = [str(self.args.sim), hash_files(fps)[:12], self.demand_name(), str(self.args.scale),
+                str(self.args.sim_len), self.args.mode, str(self.demand_seed()), str(self.args.insert_window), str(int(offset))]
+        return self.args.state_dir+'_'.join(name)
+
+    def save_state(self, fp):
+        check_and_make_dir(self.args.state_dir)
+        self.conn.simulation.saveState(fp+'.xml')
+        #sim bookkeeping sumo does not know about,
+        #written last so it marks a complete state
+        save_data(fp+'.p', {'t':self.t,
+                            'v_start_times':self.v_start_times,
+                            'tt_stats':self.tt_stats,
+                            'travel_times':self.travel_times,
+                            'vehiclegen':self.vehiclegen.get_state() if self.vehiclegen else None})
+
+    def load_state(self, fp):
+        self.conn.simulation.loadState(fp+'.xml')
+        state = load_data(fp+'.p')
+        self.t = state['t']
+        self.v_start_times = state['v_start_times']
+        self.tt_stats = state['tt_stats']
+        self.travel_times = state['travel_times']
+        if self.vehiclegen:
+            self.vehiclegen.set_state(state['vehiclegen'])
+
     def run(self):
         #execute simulation for desired length
         while self.t < self.sim_len:
@@ -158,39 +414,91 @@ class SumoSim:
             if self.vehiclegen:
                 self.vehiclegen.run()
             self.update_travel_times()
-            #run all traffic signal controllers in network
+            #fetch vehicle data once and share it with
+            #all traffic signal controllers in network
+            snapshot = self.get_vehicle_snapshot()
+            if self.network_metrics:
+                self.network_metrics.update(snapshot)
             for t in self.tsc:
-                self.tsc[t].run()
+                self.tsc[t].run(snapshot)
+            if self.metrics_writer:
+                self.metrics_writer.append([self.tsc[t].trafficmetrics.get_last(m) for t, m in self.metric_columns])
+            if self.recorder:
+                if self.network_metrics:
+                    for m in self.network_metrics.metrics:
+                        self.recorder.record('net_'+m, self.network_metrics.get_network(m))
+                for t in self.tsc:
+                    self.recorder.record('tp_'+t, self.tsc[t].trafficmetrics.get_throughput())
             self.sim_step()
+        if self.metrics_writer:
+            self.metrics_writer.close()
+            self.metrics_writer = None
 
     def update_travel_times(self):
-        for v in self.conn.simulation.getDepartedIDList():
+        departed = self.conn.simulation.getDepartedIDList()
+        for v in departed:
             self.v_start_times[v] = self.t
+        if self.gui and self.vehiclegen:
+            self.vehiclegen.color_vehicles(departed)
 
         for v in self.conn.simulation.getArrivedIDList():
-            self.v_travel_times[v] = self.t - self.v_start_times[v]
+            self.add_travel_time(self.t - self.v_start_times[v])
             del self.v_start_times[v]
 
-    def get_intersection_subscription(self):
-        tl_data = {}
-        lane_vehicles = { l:{} for l in self.lanes}
-        for tl in self.tl_junc:
-            tl_data[tl] = self.conn.junction.getContextSubscriptionResults(tl)
-            if tl_data[tl] is not None:
-                for v in tl_data[tl]:
-                    lane_vehicles[ tl_data[tl][v][traci.constants.VAR_LANE_ID] ][v] = tl_data[tl][v]
-        return lane_vehicles
+    def add_travel_time(self, tt):
+        self.tt_stats.update(tt)
+        if self.travel_times is not None:
+            self.travel_times.append(tt)
+
+    def subscribe_lanes(self):
+        #a context subscription on each lane a controller reads
+        #returns exactly the vehicles on that lane over its full
+        #length, the range only has to absorb lateral offsets
+        v_vars = [traci.constants.VAR_LANE_ID]+[SNAPSHOT_VARS[c] for c in self.vehicle_columns]
+        for l in self.lane_idx:
+            self.conn.lane.subscribeContext(l, traci.constants.CMD_GET_VEHICLE_VARIABLE, LANE_CONTEXT_RANGE, v_vars)
+
+    def get_vehicle_snapshot(self):
+        #decode the lane subscriptions once per step into columns,
+        #each vehicle appears exactly once regardless of how many
+        #controllers read its lane
+        lane_idx = self.lane_idx
+        v_intern = self.v_intern
+        v_lanes, v_ids = [], []
+        v_cols = [(SNAPSHOT_VARS[c], []) for c in self.vehicle_columns]
+        c_data = self.conn.lane.getAllContextSubscriptionResults()
+        for l in c_data:
+            i = lane_idx[l]
+            for v, d in c_data[l].items():
+                #contexts of neighbouring lanes can overlap
+                #where lanes meet, only keep vehicles on l
+                if d[traci.constants.VAR_LANE_ID] == l:
+                    v_lanes.append(i)
+                    if v not in v_intern:
+                        v_intern[v] = len(v_intern)
+                    v_ids.append(v_intern[v])
+                    for var, col in v_cols:
+                        col.append(d[var])
+        snapshot = VehicleSnapshot(np.array(v_lanes, dtype=np.int32),
+                                   np.array(v_ids, dtype=np.int32),
+                                   len(lane_idx),
+                                   {c:np.array(col, dtype=np.float32) for c, (var, col) in zip(self.vehicle_columns, v_cols)})
+        #metrics follow the vehicles entering and leaving
+        #lanes instead of comparing all vehicles every step
+        if len(self.v_lane) < len(v_intern):
+            self.v_lane = np.concatenate((self.v_lane, np.full(len(v_intern)-len(self.v_lane), -1, dtype=np.int32)))
+        snapshot.track_changes(self.prev_snapshot, self.v_lane)
+        self.prev_snapshot = snapshot
+        return snapshot
 
     def sim_stats(self):
-        tt = self.get_travel_times()
-        if len(tt) > 0 :
-            #print( '----------\ntravel time (mean, std) ('+str(np.mean(tt))+', '+str(np.std(tt))+')\n' )
-            return [str(int(np.mean(tt))), str(int(np.std(tt)))]
+        if self.tt_stats.n > 0 :
+            return [str(int(self.tt_stats.mean())), str(int(self.tt_stats.std()))]
         else:
             return [str(int(0.0)), str(int(0.0))]
 
     def get_travel_times(self):
-        return [self.v_travel_times[v] for v in self.v_travel_times]
+        return self.travel_times
 
     def get_tsc_metrics(self):
         tsc_metrics = {}
@@ -199,6 +507,9 @@ class SumoSim:
         return tsc_metrics
 
     def close(self):
-        #self.conn.close()
+        if self.recorder:
+            self.recorder.close()
         self.conn.close()
-        self.sumo_process.terminate()
+        self.conn = None
+        if self.sumo_process:
+            self.sumo_process.terminate()
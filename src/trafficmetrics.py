@@ -8,36 +8,124 @@ else:
     sys.exit("please declare environment variable 'SUMO_HOME'")
 
 import traci
-import pickle
+import numpy as np
+
+from src.metrichistory import MetricHistory
+from src.delaytracker import DelayTracker
+
+#registered metrics, name -> TrafficMetric subclass
+METRICS = {}
+
+def register_metric(name):
+    def register(cls):
+        cls.name = name
+        METRICS[name] = cls
+        return cls
+    return register
+
+def parse_metric_args(metric_args):
+    #metric names with an optional number of steps between
+    #samples, e.g. ['delay', 'co2:10'], to {name:steps}
+    if isinstance(metric_args, dict):
+        return dict(metric_args)
+    specs = {}
+    for arg in metric_args:
+        name, _, freq = arg.partition(':')
+        assert name in METRICS, 'Supplied metric '+str(name)+' does not exist, options: '+', '.join(sorted(METRICS))
+        freq = int(freq) if freq else METRICS[name].sample_freq
+        assert freq == 1 or not METRICS[name].every_step, 'Metric '+str(name)+' has to be updated every step'
+        specs[name] = freq
+    return specs
+
+def metric_columns(metric_args):
+    #vehicle snapshot columns the metrics compute from
+    return set([c for m in metric_args for c in METRICS[m].columns])
 
 class TrafficMetrics:
-    def __init__(self, _id, incoming_lanes, netdata, metric_args, mode):
-        self.metrics = {}
-        if 'delay' in metric_args:
-            lane_lengths = {lane:netdata['lane'][lane]['length'] for lane in incoming_lanes}
-            lane_speeds = {lane:netdata['lane'][lane]['speed'] for lane in incoming_lanes}
-            self.metrics['delay'] = DelayMetric(_id, incoming_lanes, mode, lane_lengths, lane_speeds )
+    def __init__(self, _id, incoming_lanes, netdata, metric_args, mode, delay_source='travel', throughput=False):
+        #only the requested metrics exist and cost anything per step
+        self.freqs = parse_metric_args(metric_args)
+        if throughput and 'delay' not in self.freqs:
+            #throughput is counted by the delay metric
+            self.freqs['delay'] = 1
+        self.metrics = {m:METRICS[m](_id, incoming_lanes, netdata, mode) for m in self.freqs}
+        if 'delay' in self.metrics:
+            self.metrics['delay'].waiting = delay_source == 'waiting'
+        self.t = 0
+        #sim wide NetworkMetrics computing these metrics instead
+        self.network = None
+        self.network_idx = None
+
+    def use_network(self, network, idx):
+        #read metrics from the sim's NetworkMetrics, column idx
+        self.network = network
+        self.network_idx = idx
 
-        if 'queue' in metric_args:
-            self.metrics['queue'] = QueueMetric(_id, incoming_lanes, mode)
+    def index_lanes(self, lane_idx):
+        for m in self.metrics:
+            self.metrics[m].index_lanes(lane_idx)
+
+    def init_histories(self, length, res, keep=True):
+        #size the histories once the sim knows the steps left
+        for m in self.metrics:
+            self.metrics[m].init_history(length, res, keep)
 
     def update(self, v_data):
+        if self.network is not None:
+            return
         for m in self.metrics:
-            self.metrics[m].update(v_data)
+            if self.t % self.freqs[m] == 0:
+                self.metrics[m].update(v_data)
+        self.t += 1
 
     def get_metric(self, metric):
+        if self.network is not None:
+            return self.network.get_metric(metric)[self.network_idx]
         return self.metrics[metric].get_metric()
 
     def get_history(self, metric):
+        if self.network is not None:
+            return self.network.get_history(metric)[:,self.network_idx]
         return self.metrics[metric].get_history()
 
+    def get_last(self, metric):
+        #latest sample of the metric history
+        if self.network is not None:
+            return self.network.histories[metric].last[self.network_idx]
+        return self.metrics[metric].history.last
+
+    def get_throughput(self):
+        #vehicles that have left the incoming lanes so far
+        if self.network is not None:
+            return self.network.throughput_last[self.network_idx]
+        assert 'delay' in self.metrics, 'Throughput needs the delay metric, create TrafficMetrics with throughput=True'
+        return self.metrics['delay'].throughput_last
+
 class TrafficMetric:
+    """Base class of the registered metrics.
+
+    columns are the vehicle snapshot columns a metric reads, the sim
+    subscribes the sumo variables of the metrics in use. sample_freq
+    is the default number of steps between updates, metrics that
+    track vehicles from step to step set every_step.
+    """
+    columns = []
+    sample_freq = 1
+    every_step = False
+
     def __init__(self, _id, incoming_lanes, mode):
         self.id = _id
         self.incoming_lanes = incoming_lanes
-        self.history = []
+        self.history = MetricHistory()
         self.mode = mode
 
+    def index_lanes(self, lane_idx):
+        #rows of the incoming lanes in the sim vehicle snapshot
+        self.incoming_idx = np.array([lane_idx[l] for l in self.incoming_lanes], dtype=np.int64)
+
+    def init_history(self, length, res, keep=True):
+        self.history = MetricHistory(length, res, keep=keep)
+
     def get_metric(self):
         pass
 
@@ -45,82 +133,121 @@ class TrafficMetric:
         pass
 
     def get_history(self):
-        return self.history
+        return self.history.get()
 
+@register_metric('delay')
 class DelayMetric(TrafficMetric):
-    def __init__(self, _id, incoming_lanes, mode, lane_lengths, lane_speeds):
+    every_step = True
+
+    def __init__(self, _id, incoming_lanes, netdata, mode):
         super().__init__( _id, incoming_lanes, mode)
-        self.lane_travel_times = {lane:lane_lengths[lane]/float(lane_speeds[lane]) for lane in incoming_lanes}
-        self.old_v = set()
-        self.v_info = {}
+        lanes = netdata['compact'].lanes(incoming_lanes)
+        self.lane_travel_times = netdata['compact'].lane_length[lanes]/netdata['compact'].lane_speed[lanes]
+        #delay of the vehicles on the incoming lanes
+        self.delay = DelayTracker()
+        #accumulated waiting time on incoming lanes, used as
+        #delay if waiting, the sim then subscribes it from sumo
+        self.waiting = False
+        self.lane_waits = np.zeros(len(self.incoming_lanes))
+        self.tracking = False
         self.t = 0
-        self.throughput = []
+        #vehicles that have left the incoming lanes so far
+        self.throughput = MetricHistory(cumulative=True)
         self.throughput_last = 0
 
-    def get_v_delay(self, v):
-        return ( self.t - self.v_info[v]['t'] ) - self.lane_travel_times[self.v_info[v]['lane']]
+    def init_history(self, length, res, keep=True):
+        super().init_history(length, res, keep)
+        self.throughput = MetricHistory(length, res, cumulative=True, keep=keep)
+
+    def index_lanes(self, lane_idx):
+        super().index_lanes(lane_idx)
+        #position of each snapshot lane in incoming_lanes, -1 if not incoming
+        self.lane_pos = np.full(len(lane_idx), -1, dtype=np.int64)
+        self.lane_pos[self.incoming_idx] = np.arange(len(self.incoming_idx))
 
     def get_metric(self):
         #calculate delay of vehicles on incoming lanes
-        delay = 0
-        for v in self.old_v:
-            #calculate individual vehicle delay
-            v_delay = self.get_v_delay(v)
-            if v_delay > 0:
-                delay += v_delay
-
-        return delay
+        if self.waiting:
+            return self.lane_waits.sum()
+        return self.delay.get_delays(self.t)[0]
 
     def update(self, v_data):
-        new_v = set()
-
-        #record start time and lane of new_vehicles
-        for lane in self.incoming_lanes:
-            for v in v_data[lane]:
-                if v not in self.old_v:
-                    self.v_info[v] = {}
-                    self.v_info[v]['t'] = self.t
-                    self.v_info[v]['lane'] = lane
-            new_v.update( set(v_data[lane].keys()) )
-
         if self.mode == 'test':
             self.history.append(self.get_metric())
 
-        #remove vehicles that have left incoming lanes
-        
-        remove_vehicles = self.old_v - new_v
-        self.throughput.append(len(remove_vehicles)+self.throughput_last)
-        self.throughput_last = self.throughput[-1]
-        if self.t>1199:
-            print(f'######### throughput length is: {len(self.throughput)}')
-            file = open("/home/yan/work_spaces/tsc-rl/video/tp.data", 'wb')
-            pickle.dump(self.throughput, file)
-            file.close()
-        
-        delay = 0
-        for v in remove_vehicles:
-            del self.v_info[v]
-        
-        self.old_v = new_v
+        if self.waiting:
+            self.lane_waits = v_data.lane_sums('wait')[self.incoming_idx]
+
+        if self.tracking:
+            #only vehicles that changed lane since the last step
+            left = v_data.lanes_left(self.incoming_idx)
+            entered, entered_lanes = v_data.lanes_entered(self.incoming_idx)
+            if len(left) > 0 and len(entered) > 0:
+                #vehicles changing between incoming lanes keep their due time
+                stay = np.isin(entered, left, assume_unique=True)
+                if stay.any():
+                    left = left[~np.isin(left, entered[stay], assume_unique=True)]
+                    entered = entered[~stay]
+                    entered_lanes = entered_lanes[~stay]
+        else:
+            #first step, every vehicle on the incoming lanes is new
+            left = np.zeros(0, dtype=np.int32)
+            entered = v_data.lanes_ids(self.incoming_idx)
+            entered_lanes = np.repeat(self.incoming_idx, v_data.counts[self.incoming_idx])
+            self.tracking = True
+
+        #vehicles that have left incoming lanes
+        self.throughput_last += int(self.delay.remove_vehicles(left)[0])
+        self.throughput.append(self.throughput_last)
+
+        #record when new vehicles start being delayed
+        self.delay.add_vehicles(entered, self.t+self.lane_travel_times[self.lane_pos[entered_lanes]])
         self.t += 1
 
-class QueueMetric(TrafficMetric):
-    def __init__(self, _id, incoming_lanes, mode):
+class LaneMetric(TrafficMetric):
+    """Metric summed over the incoming lanes from a value per
+    snapshot lane, which NetworkMetrics can group the same way.
+    """
+    def __init__(self, _id, incoming_lanes, netdata, mode):
         super().__init__( _id, incoming_lanes, mode)
-        self.stop_speed = 0.3
-        self.lane_queues = {lane:0 for lane in self.incoming_lanes}
+        self.values = np.zeros(len(self.incoming_lanes))
+
+    @classmethod
+    def lane_values(cls, v_data):
+        raise NotImplementedError("Subclasses should implement this!")
 
     def get_metric(self):
-        return sum([self.lane_queues[lane] for lane in self.lane_queues])
+        return self.values.sum()
 
     def update(self, v_data):
-        lane_queues = {}
-        for lane in self.incoming_lanes:
-            lane_queues[lane] = 0
-            for v in v_data[lane]:
-                if v_data[lane][v][traci.constants.VAR_SPEED] < self.stop_speed:
-                    lane_queues[lane] += 1
-
-        self.lane_queues = lane_queues
+        self.values = self.lane_values(v_data)[self.incoming_idx]
         if self.mode == 'test':
             self.history.append(self.get_metric())
+
+@register_metric('queue')
+class QueueMetric(LaneMetric):
+    #vehicles slower than stop_speed (m/s) are queued
+    columns = ['speed']
+    stop_speed = 0.3
+
+    @classmethod
+    def lane_values(cls, v_data):
+        return v_data.lane_queues(cls.stop_speed)
+
+@register_metric('waiting')
+class WaitingMetric(LaneMetric):
+    #sumo accumulated waiting time (s) of vehicles on incoming lanes
+    columns = ['wait']
+
+    @classmethod
+    def lane_values(cls, v_data):
+        return v_data.lane_sums('wait')
+
+@register_metric('co2')
+class EmissionMetric(LaneMetric):
+    #co2 emission (mg/s) of vehicles on incoming lanes
+    columns = ['co2']
+
+    @classmethod
+    def lane_values(cls, v_data):
+        return v_data.lane_sums('co2')
@@ -13,17 +13,26 @@ else:
 
 import traci
 
-from src.trafficmetrics import TrafficMetrics
+from src.trafficmetrics import TrafficMetrics, parse_metric_args
 
 class TrafficSignalController:
     """Abstract base class for all traffic signal controller.
 
     Build your own traffic signal controller by implementing the follow methods.
     """
+    #vehicle snapshot columns the controller reads, the
+    #sim only subscribes the columns something reads
+    vehicle_columns = []
+    #metrics the controller needs whichever are recorded
+    required_metrics = []
+
     def __init__(self, conn, tsc_id, mode, netdata, red_t, yellow_t):
         self.conn = conn
         self.id = tsc_id
+        self.mode = mode
         self.netdata = netdata
+        #array form of the net, shared by all procs
+        self.compact = netdata['compact']
         self.red_t = red_t
         self.yellow_t = yellow_t
         self.green_phases = self.get_tl_green_phases()
@@ -31,12 +40,6 @@ class TrafficSignalController:
         self.all_red = len((self.green_phases[0]))*'r'
         self.phase = self.all_red
         self.phase_lanes = self.phase_lanes(self.green_phases)
-        #create subscription for this traffic signal junction to gather
-        #vehicle information efficiently
-        self.conn.junction.subscribeContext(tsc_id, traci.constants.CMD_GET_VEHICLE_VARIABLE, 150, 
-                                        [traci.constants.VAR_LANEPOSITION, 
-                                        traci.constants.VAR_SPEED, 
-                                        traci.constants.VAR_LANE_ID])
         #get all incoming lanes to intersection
         self.incoming_lanes = set()
         for p in self.phase_lanes:
@@ -44,24 +47,48 @@ class TrafficSignalController:
                 self.incoming_lanes.add(l)
 
         self.incoming_lanes = sorted(list(self.incoming_lanes))
+        #lanes this controller reads from the sim vehicle snapshot,
+        #subclasses extend this if they need more than incoming lanes
+        self.data_lanes = list(self.incoming_lanes)
         #lane capacity is the lane length divided by the average vehicle length+stopped headway
-        self.lane_capacity = np.array([float(self.netdata['lane'][lane]['length'])/7.5 for lane in self.incoming_lanes])
+        self.lane_capacity = self.compact.lane_capacity[self.compact.lanes(self.incoming_lanes)]
         #for collecting various traffic metrics at the intersection
-        #can be extended in trafficmetric.py class to collect new metrics
-        if mode == 'train':
-            self.metric_args = ['delay']
-        if mode == 'test':
-            self.metric_args = ['queue', 'delay']
-        self.trafficmetrics = TrafficMetrics(tsc_id, self.incoming_lanes, netdata, self.metric_args, mode)
+        #new metrics are registered in trafficmetrics.py
+        self.set_metric_args()
+        #rl controllers create a StateEncoder for get_state
+        self.state_encoder = None
+        #max pressure controllers create a PhasePressure
+        self.phase_pressure = None
 
         self.ep_rewards = []
         
-    def run(self):
-        data = self.get_subscription_data()
-        self.trafficmetrics.update(data)
-        self.update(data)
+    def set_metric_args(self, metric_args=None, delay_source='travel', throughput=False):
+        #metric names with optional steps between samples, 'name[:steps]'
+        if metric_args is None:
+            metric_args = ['delay'] if self.mode == 'train' else ['queue', 'delay']
+        specs = parse_metric_args(metric_args)
+        for m in self.required_metrics:
+            if m not in specs:
+                specs[m] = 1
+        self.metric_args = list(specs)
+        #throughput is also tracked when asked for without the delay metric
+        self.trafficmetrics = TrafficMetrics(self.id, self.incoming_lanes, self.netdata, specs, self.mode,
+                                             delay_source, throughput)
+
+    def run(self, snapshot):
+        self.trafficmetrics.update(snapshot)
+        self.update(snapshot)
         self.increment_controller()
 
+    def index_lanes(self, lane_idx):
+        """map lanes to their row in the sim vehicle
+        snapshot, called once the sim knows all lanes read
+        """
+        self.lane_idx = lane_idx
+        self.incoming_idx = np.array([lane_idx[l] for l in self.incoming_lanes], dtype=np.int64)
+        self.phase_lanes_idx = {p:np.array([lane_idx[l] for l in self.phase_lanes[p]], dtype=np.int64) for p in self.phase_lanes}
+        self.trafficmetrics.index_lanes(lane_idx)
+
     def get_metrics(self):
         for m in self.metric_args:
             metric = self.trafficmetrics.get_metric(m)
@@ -97,20 +124,6 @@ class TrafficSignalController:
         """
         raise NotImplementedError("Subclasses should implement this!")
 
-    def get_subscription_data(self):
-        #use SUMO subscription to retrieve vehicle info in batches
-        #around the traffic signal controller
-        tl_data = self.conn.junction.getContextSubscriptionResults(self.id)                          
-        #create empty incoming lanes for use else where
-        lane_vehicles = {l:{} for l in self.incoming_lanes}
-        if tl_data is not None:
-            for v in tl_data:
-                lane = tl_data[v][traci.constants.VAR_LANE_ID]
-                if lane not in lane_vehicles:
-                    lane_vehicles[lane] = {}
-                lane_vehicles[lane][v] = tl_data[v] 
-        return lane_vehicles
-
     def get_tl_green_phases(self):
         logic = self.conn.trafficlight.getCompleteRedYellowGreenDefinition(self.id)[0]
         #get only the green phases
@@ -122,23 +135,7 @@ class TrafficSignalController:
         return sorted(green_phases)
     
     def phase_lanes(self, actions):
-        phase_lanes = {a:[] for a in actions}
-        for a in actions:
-            green_lanes = set()
-            red_lanes = set()
-            for s in range(len(a)):
-                if a[s] == 'g' or a[s] == 'G':
-                    green_lanes.add(self.netdata['inter'][self.id]['tlsindex'][s])
-                elif a[s] == 'r':
-                    red_lanes.add(self.netdata['inter'][self.id]['tlsindex'][s])
-
-            ###some movements are on the same lane, removes duplicate lanes
-            pure_green = [l for l in green_lanes if l not in red_lanes]
-            if len(pure_green) == 0:
-                phase_lanes[a] = list(set(green_lanes))
-            else:
-                phase_lanes[a] = list(set(pure_green))
-        return phase_lanes
+        return get_phase_lanes(self.netdata, self.id, actions)
 
     #helper functions for rl controllers
     def input_to_one_hot(self, phases):
@@ -149,29 +146,21 @@ class TrafficSignalController:
     def int_to_input(self, phases):
         return { p:phases[p] for p in range(len(phases)) }
 
-    def get_state(self):
-        #the state is the normalized density of all incoming lanes 
-        return np.concatenate([self.get_normalized_density(), self.get_normalized_queue()])
+    def get_state(self, phase):
+        #the state is the normalized density and queue of all incoming lanes
+        #and a one hot encoding of phase, written to a preallocated buffer
+        return self.state_encoder.encode(self.data, self.incoming_idx, phase)
 
     def get_normalized_density(self):
         #number of vehicles in each incoming lane divided by the lane's capacity
-        return np.array([len(self.data[lane]) for lane in self.incoming_lanes])/self.lane_capacity
+        return self.data.counts[self.incoming_idx]/self.lane_capacity
 
     def get_normalized_queue(self):
-        lane_queues = []
-        for lane in self.incoming_lanes:
-            q = 0
-            for v in self.data[lane]:
-                if self.data[lane][v][traci.constants.VAR_SPEED] < 0.3:
-                    q += 1
-            lane_queues.append(q)
-        return np.array(lane_queues)/self.lane_capacity
+        #number of stopped vehicles in each incoming lane divided by the lane's capacity
+        return self.data.lane_queues(0.3)[self.incoming_idx]/self.lane_capacity
 
     def empty_intersection(self):
-        for lane in self.incoming_lanes:
-            if len(self.data[lane]) > 0:
-                return False
-        return True
+        return self.data.counts[self.incoming_idx].sum() == 0
 
     def get_reward(self):
         #return negative delay as reward
@@ -243,3 +232,25 @@ if n_ror != n_g:
     print(green_phases)
     print(ror_phases)
 '''
+
+def get_phase_lanes(netdata, tsc_id, actions):
+    """incoming lanes of an intersection that have green
+    in each phase, from the net's tls link indices
+    """
+    phase_lanes = {a:[] for a in actions}
+    for a in actions:
+        green_lanes = set()
+        red_lanes = set()
+        for s in range(len(a)):
+            if a[s] == 'g' or a[s] == 'G':
+                green_lanes.add(netdata['inter'][tsc_id]['tlsindex'][s])
+            elif a[s] == 'r':
+                red_lanes.add(netdata['inter'][tsc_id]['tlsindex'][s])
+
+        ###some movements are on the same lane, removes duplicate lanes
+        pure_green = [l for l in green_lanes if l not in red_lanes]
+        if len(pure_green) == 0:
+            phase_lanes[a] = list(set(green_lanes))
+        else:
+            phase_lanes[a] = list(set(pure_green))
+    return phase_lanes
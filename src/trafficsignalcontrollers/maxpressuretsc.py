@@ -1,8 +1,10 @@
 import random
+import numpy as np
 from itertools import cycle
 from collections import deque
 
 from src.trafficsignalcontroller import TrafficSignalController
+from src.phasepressure import PhasePressure
 
 class MaxPressureTSC(TrafficSignalController):
     def __init__(self, conn, tsc_id, mode, netdata, red_t, yellow_t, green_t):
@@ -13,6 +15,11 @@ class MaxPressureTSC(TrafficSignalController):
         #print(tsc_id)
         self.phase_deque = deque()
         self.max_pressure_lanes = self.max_pressure_lanes()
+        #max pressure also needs vehicles on outgoing lanes
+        out_lanes = set()
+        for g in self.max_pressure_lanes:
+            out_lanes.update(self.max_pressure_lanes[g]['out'])
+        self.data_lanes = sorted(set(self.data_lanes) | out_lanes)
         self.data = None
         #store how many green movements each phase has
         #for breaking ties in max pressure
@@ -39,38 +46,34 @@ class MaxPressureTSC(TrafficSignalController):
             out_lanes = set()
             for l in self.phase_lanes[g]:
                 inc_lanes.add(l)
-                for ol in self.netdata['lane'][l]['outgoing']:
+                for ol in self.compact.lane_outgoing(l):
                     out_lanes.add(ol)
 
             max_pressure_lanes[g] = {'inc':inc_lanes, 'out':out_lanes}
         return max_pressure_lanes
 
+    def index_lanes(self, lane_idx):
+        super().index_lanes(lane_idx)
+        #phase x lane incidence of the green phases, built once
+        idx = {k:[np.array([lane_idx[l] for l in self.max_pressure_lanes[g][k]], dtype=np.int64)
+                  for g in self.green_phases] for k in ['inc', 'out']}
+        self.phase_pressure = PhasePressure(idx['inc'], idx['out'])
+
     def max_pressure(self):
-        phase_pressure = {}
-        no_vehicle_phases = []
-        #compute pressure for all green movements
-        for g in self.green_phases:
-            inc_lanes = self.max_pressure_lanes[g]['inc']
-            out_lanes = self.max_pressure_lanes[g]['out']
-            #pressure is defined as the number of vehicles in a lane
-            inc_pressure = sum([ len(self.data[l]) if l in self.data else 0 for l in inc_lanes])
-            out_pressure = sum([ len(self.data[l]) if l in self.data else 0 for l in out_lanes])
-            phase_pressure[g] = inc_pressure - out_pressure
-            if inc_pressure == 0 and out_pressure == 0:
-                no_vehicle_phases.append(g)
+        #pressure is defined as the number of vehicles in a lane,
+        #incoming minus outgoing for all green movements of a phase
+        pressure, vehicles = self.phase_pressure.pressure(self.data)
 
         ###if no vehicles randomly select a phase
-        if len(no_vehicle_phases) == len(self.green_phases):
+        if not vehicles.any():
             return random.choice(self.green_phases)
         else:
             #choose phase with max pressure
-            #if two phases have equivalent pressure
-            #select one with more green movements
+            #if phases have equivalent pressure select
+            #one of them at random, in green phase order
             #return max(phase_pressure, key=lambda p:phase_pressure[p])
-            phase_pressure = [ (p, phase_pressure[p]) for p in phase_pressure]
-            phase_pressure = sorted(phase_pressure, key=lambda p:p[1], reverse=True)
-            phase_pressure = [ p for p in phase_pressure if p[1] == phase_pressure[0][1] ]
-            return random.choice(phase_pressure)[0]
+            ties = np.flatnonzero(pressure == pressure.max())
+            return self.green_phases[random.choice(ties)]
 
             '''
             if len(phase_pressure) == 1:
@@ -3,15 +3,20 @@ from itertools import cycle
 from collections import deque
 
 from src.trafficsignalcontroller import TrafficSignalController
+from src.stateencoder import StateEncoder
 
 class NextDurationRLTSC(TrafficSignalController):
+    #queues in the state, delay in the reward
+    vehicle_columns = ['speed']
+    required_metrics = ['delay']
+
     def __init__(self, conn, tsc_id, mode, netdata, red_t, yellow_t, gmin, gmax, rlagent):
         super().__init__(conn, tsc_id, mode, netdata, red_t, yellow_t)
         self.cycle = cycle(self.green_phases)
         self.phase_deque = deque()
         self.data = None
         self.rlagent = rlagent
-        self.phase_to_one_hot = self.input_to_one_hot(self.green_phases+[self.all_red])
+        self.state_encoder = StateEncoder(self.lane_capacity, self.green_phases+[self.all_red])
         #help convert tanh rl action to constrained
         #next phase duration
         self.mid = ((gmax - gmin)/2.0) + gmin
@@ -36,11 +41,11 @@ class NextDurationRLTSC(TrafficSignalController):
             phase = next(self.cycle)
             if not self.phase_lanes_empty(phase):
                 if self.acting:
-                    state = np.concatenate( [self.get_state(), self.phase_to_one_hot[phase]] )
+                    state = self.get_state(phase)
                     terminal = False
                     self.store_experience(state, terminal)
                 if not self.acting:
-                    state = np.concatenate( [self.get_state(), self.phase_to_one_hot[phase]] ) 
+                    state = self.get_state(phase) 
                 self.s = state                                                                         
                 action = self.rlagent.get_action(state)                                                       
                 self.a = action                                                                        
@@ -52,7 +57,7 @@ class NextDurationRLTSC(TrafficSignalController):
         phase = self.all_red
         if self.acting:
             #print('-------TERMINAL---------')
-            state = np.concatenate( [self.get_state(), self.phase_to_one_hot[phase]] )
+            state = self.get_state(phase)
             terminal = True
             self.store_experience(state, terminal)
             self.acting = False
@@ -82,7 +87,4 @@ class NextDurationRLTSC(TrafficSignalController):
         self.data = data
 
     def phase_lanes_empty(self, phase):
-        for l in self.phase_lanes[phase]:
-            if len(self.data[l]) > 0:
-                return False
-        return True
+        return self.data.counts[self.phase_lanes_idx[phase]].sum() == 0
@@ -4,8 +4,13 @@ from itertools import cycle
 from collections import deque
 
 from src.trafficsignalcontroller import TrafficSignalController
+from src.stateencoder import StateEncoder
 
 class NextPhaseRLTSC(TrafficSignalController):
+    #queues in the state, delay in the reward
+    vehicle_columns = ['speed']
+    required_metrics = ['delay']
+
     def __init__(self, conn, tsc_id, mode, netdata, red_t, yellow_t, green_t, rlagent):
         super().__init__(conn, tsc_id, mode, netdata, red_t, yellow_t)
         self.green_t = green_t
@@ -15,7 +20,7 @@ class NextPhaseRLTSC(TrafficSignalController):
         self.phase_deque = deque()
         self.data = None
         self.delay_green = False
-        self.phase_to_one_hot = self.input_to_one_hot(self.green_phases+[self.all_red])
+        self.state_encoder = StateEncoder(self.lane_capacity, self.green_phases+[self.all_red])
         self.int_to_phase = self.int_to_input(self.green_phases)
         self.rlagent = rlagent
         #experience dict
@@ -49,8 +54,8 @@ class NextPhaseRLTSC(TrafficSignalController):
         if self.empty_intersection():
             #go to all red phase
             if self.acting:
-                #state = np.concatenate( [self.get_state(), self.phase_to_one_hot[self.phase]] )[np.newaxis,...]
-                state = np.concatenate( [self.get_state(), self.phase_to_one_hot[self.phase]] )
+                #state = self.get_state(self.phase)[np.newaxis,...]
+                state = self.get_state(self.phase)
                 terminal = True
                 self.store_experience(state, terminal)
             self.acting = False
@@ -67,8 +72,8 @@ class NextPhaseRLTSC(TrafficSignalController):
             self.delay_green = False
             #state is a concatenation of the normalized density
             #and one hot hot vector encoding the previous phase
-            #state = np.concatenate( [self.get_state(), self.phase_to_one_hot[self.phase]] )[np.newaxis,...]
-            state = np.concatenate( [self.get_state(), self.phase_to_one_hot[self.phase]] )
+            #state = self.get_state(self.phase)[np.newaxis,...]
+            state = self.get_state(self.phase)
             if self.acting:
                 terminal = False
                 self.store_experience(state, terminal)
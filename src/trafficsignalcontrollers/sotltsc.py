@@ -1,4 +1,5 @@
 import random, os, sys
+import numpy as np
 from itertools import cycle
 from collections import deque
 
@@ -13,6 +14,9 @@ else:
 import traci
 
 class SOTLTSC(TrafficSignalController):
+    #vehicle positions to count approaching vehicles
+    vehicle_columns = ['pos']
+
     def __init__(self, conn, tsc_id, mode, netdata, red_t, yellow_t, g_min, theta, omega, mu):
         super().__init__(conn, tsc_id, mode, netdata, red_t, yellow_t)
         self.g_min = g_min
@@ -24,6 +28,7 @@ class SOTLTSC(TrafficSignalController):
         self.phase_idx = 0
         self.time_in_phase = 0
         self.phase_red_lanes = self.get_phase_red_lanes()
+        self.phase_lane_lengths = {g:self.compact.lane_length[self.compact.lanes(self.phase_lanes[g])] for g in self.green_phases}
         self.phase_deque = deque([self.green_phases[self.phase_idx]])
 
     def next_phase(self):
@@ -78,7 +83,11 @@ class SOTLTSC(TrafficSignalController):
         g = self.green_phases[self.phase_idx%len(self.green_phases)]
         #vehicle time integral, used to control
         #incrementing phase
-        self.kappa += sum([ len(data[l])  for l in self.phase_red_lanes[g]])
+        self.kappa += data.counts[self.phase_red_idx[g]].sum()
+
+    def index_lanes(self, lane_idx):
+        super().index_lanes(lane_idx)
+        self.phase_red_idx = {g:np.array([lane_idx[l] for l in self.phase_red_lanes[g]], dtype=np.int64) for g in self.phase_red_lanes}
 
     def get_phase_red_lanes(self):
         all_incoming_lanes = []
@@ -97,13 +106,9 @@ class SOTLTSC(TrafficSignalController):
         #count the number of vehicles
         #approaching (within omega distance)
         #the intersection in green lanes
-        for l in self.phase_lanes[self.phase]:
-            approaching_v = 0
-            for v in self.data[l]:
-                if self.netdata['lane'][l]['length'] - self.data[l][v][traci.constants.VAR_LANEPOSITION] < self.omega:
-                    approaching_v += 1
-                if approaching_v > self.mu:
-                    break
+        for l, length in zip(self.phase_lanes[self.phase], self.phase_lane_lengths[self.phase]):
+            pos = self.data.pos[self.data.lane_slice(self.lane_idx[l])]
+            approaching_v = np.count_nonzero(length - pos < self.omega)
         return approaching_v
 
         
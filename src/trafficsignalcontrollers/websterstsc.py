@@ -1,10 +1,12 @@
+import numpy as np
 from itertools import cycle
 from collections import deque
 
 from src.trafficsignalcontroller import TrafficSignalController
+from src.stoplinedetectors import detector_id
 
 class WebstersTSC(TrafficSignalController):
-    def __init__(self, conn, tsc_id, mode, netdata, red_t, yellow_t, g_min, c_min, c_max, sat_flow=0.38, update_freq=None):
+    def __init__(self, conn, tsc_id, mode, netdata, red_t, yellow_t, g_min, c_min, c_max, sat_flow=0.38, update_freq=None, detectors=False):
         super().__init__(conn, tsc_id, mode, netdata, red_t, yellow_t)
         self.cycle = self.get_phase_cycle()
         self.g_min = g_min
@@ -17,6 +19,12 @@ class WebstersTSC(TrafficSignalController):
         #for keeping track of vehicle counts for websters calc
         self.phase_lane_counts = self.get_empty_phase_lane_counts()
         self.prev_data = None
+        #count vehicles with the sim's stop line induction loops,
+        #read at phase changes, instead of diffing vehicle data
+        self.detectors = detectors
+        if self.detectors:
+            #vehicles that passed each loop at the last read
+            self.det_counts = {l:0 for l in self.incoming_lanes}
 
     def get_phase_cycle(self):
         phase_cycle = []
@@ -39,9 +47,36 @@ class WebstersTSC(TrafficSignalController):
         else:
             return self.red_t
 
+    def increment_controller(self):
+        decide = self.detectors and self.phase_time == 0
+        if decide:
+            #vehicles that passed during the green phase ending now
+            self.count_green()
+        super().increment_controller()
+        if decide:
+            #vehicles that passed before the new phase do not count
+            self.count_green(count=False)
+
+    def count_green(self, count=True):
+        """add the vehicles that passed the stop line of the
+        green phase lanes since they were last read to the
+        phase lane counts, one loop read per lane
+        """
+        if self.phase not in self.green_phases:
+            return
+        for l in self.phase_lanes[self.phase]:
+            n = self.conn.inductionloop.getIntervalVehicleNumber(detector_id(l))
+            if count:
+                self.phase_lane_counts[self.phase][l] += n - self.det_counts[l]
+            self.det_counts[l] = n
+
     def update(self, data):
         #update vehicle counts
-        if self.phase in self.green_phases:
+        if self.detectors:
+            if self.t % self.update_freq == 0:
+                #vehicles of the green phase up to the window end
+                self.count_green()
+        elif self.phase in self.green_phases:
             self.update_phase_lane_counts(data)
         ###need to keep track of lane counts using data
         if self.t % self.update_freq == 0:
@@ -57,15 +92,11 @@ class WebstersTSC(TrafficSignalController):
         this natively FFS
         """
         if self.prev_data:
-            incoming_vehicles = set([]) 
-            for l in self.phase_lanes[self.phase]:
-                for v in data[l]:
-                    incoming_vehicles.add(v)
+            incoming_vehicles = data.lanes_ids(self.phase_lanes_idx[self.phase])
 
             for l in self.phase_lanes[self.phase]:
-                for v in self.prev_data[l]:
-                    if v not in incoming_vehicles:
-                        self.phase_lane_counts[self.phase][l] += 1
+                prev_vehicles = self.prev_data.ids(self.lane_idx[l])
+                self.phase_lane_counts[self.phase][l] += np.count_nonzero(~np.isin(prev_vehicles, incoming_vehicles))
 
     def get_empty_phase_lane_counts(self):
         phase_lane_counts = {}
@@ -11,7 +11,7 @@ def tsc_factory(tsc_type, tl, args, netdata, rl_stats, exp_replay, neural_networ
         return WebstersTSC(conn, tl, args.mode, netdata, args.r, args.y,
                            args.g_min, args.c_min,
                            args.c_max, args.sat_flow,
-                           args.update_freq)
+                           args.update_freq, args.detectors)
     elif tsc_type == 'sotl':
         return SOTLTSC(conn, tl, args.mode, netdata, args.r, args.y,
                        args.g_min, args.theta, args.omega,
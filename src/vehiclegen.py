@@ -1,8 +1,6 @@
 import os, sys
 import pickle as pk
-from scipy.stats import johnsonsb
-from scipy.stats import johnsonsu
-F_RATES = [60., 200., 500., 800., 1100., 1400., 1700.] # typical flow rates (v/h) with headway distribution models
+import heapq
 
 if 'SUMO_HOME' in os.environ:
     tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
@@ -15,26 +13,46 @@ import traci
 
 import numpy as np
 
+from src.headwaysampler import HeadwaySampler
+from src.demandschedule import sine_flow_rates, schedule_fp, load_schedule
+from src.helper_funcs import write_lines_to_file
+
 class VehicleGen:
-    def __init__(self, netdata, sim_len, demand, scale, mode, conn):
-        np.random.seed()
+    def __init__(self, netdata, sim_len, demand, scale, mode, conn, seed=None, gui=True, routes=None, compiled=False, window=0, route_table=None, schedule=None):
+        #private generator, seeding the global one would
+        #repeat the same draws for everything else in the process
+        self.rng = np.random.RandomState(seed)
+        #conn is None when only writing a route file, routes must be given then
         self.conn = conn
+        self.gui = gui
         self.v_data = None
         self.vehicles_created = 0
         self.netdata = netdata
         ###for generating vehicles
         self.origins = self.netdata['origin']
         self.destinations = self.netdata['destination'] 
-        self.add_origin_routes()
+        #precomputed random walk routes, registered with sumo per sim
+        self.route_table = route_table
+        if self.conn is not None:
+            self.add_origin_routes()
+            if self.route_table:
+                self.route_table.add_routes(self.conn)
         self.scale = scale
         self.sim_len = sim_len
         self.t = 0
         self.stop_gen = False
+        #with a window > 0 scheduled vehicles are added to sumo
+        #only window seconds before they depart
+        self.window = window
+        self.pending = None
         self.demand = demand
         self.mode = mode
+        self.headways = HeadwaySampler(random_state=self.rng)
         
-        self.routes = self.conn.route.getIDList()
-        self.routes = [route for route in self.routes if route[0]=='r' and route[1].isdigit()]
+        if routes is None:
+            routes = self.conn.route.getIDList()
+        self.routes = [route for route in routes if route[0]=='r' and route[1].isdigit()]
+        self.color_routes = {}
         if len(self.routes) == 12:
             self.color_routes = {self.routes[0]: (0,255,0), self.routes[1]: (255,255,0), self.routes[2]: (255,0,0), self.routes[3]: (0,255,0),
                                  self.routes[4]: (255,255,0), self.routes[5]: (255,0,0), self.routes[6]: (0,255,0), self.routes[7]: (255,255,0),
@@ -42,24 +60,66 @@ class VehicleGen:
 
         ###determine what function we run every step to 
         ###generate vehicles into sim
-        if demand == 'single':
+        ###demands that schedule all vehicles up front
+        ###also have a function for just the schedule
+        self.gen_schedule = None
+        if schedule is not None:
+            #an explicit schedule file replaces the demand's
+            self.gen_vehicles = lambda: self.gen_file_cycle(schedule)
+            self.gen_schedule = lambda: self.file_schedule(schedule)
+        elif demand == 'single':
             self.gen_vehicles = self.gen_single
         elif demand == 'dynamic' or mode =='train':  # use the sine wave to train rl-tsc in framework
             #self.v_schedule = self.gen_dynamic_demand(mode)
             #self.gen_vehicles = self.gen_dynamic
             self.gen_vehicles = self.gen_dynamic_sine
+            self.gen_schedule = self.sine_schedule
         elif demand[:6] == 'linear':
             self.gen_vehicles = self.gen_linear_cycle
+            self.gen_schedule = lambda: self.fr_schedule("linear")
         elif demand == 'real':
             self.gen_vehicles = self.gen_real_cycle
+            self.gen_schedule = lambda: self.fr_schedule("real")
         elif demand == 'video':
             self.gen_vehicles = self.gen_video_cycle
+            self.gen_schedule = lambda: self.fr_schedule("video")
+
+        #sumo loads the vehicles of a compiled schedule from a route file
+        self.compiled = compiled and self.gen_schedule is not None
+        if self.compiled:
+            self.stop_gen = True
 
     def run(self):
         if not self.stop_gen:
             self.gen_vehicles()
+        if self.pending is not None:
+            self.add_pending()
         self.t += 1
 
+    def add_pending(self):
+        #add the scheduled vehicles departing before the window ends
+        for depart, id_v, route in self.pop_departures(self.pending, self.t + self.window):
+            self.add_vehicle(id_v, route, depart)
+
+    def get_state(self):
+        return {'t':self.t, 'stop_gen':self.stop_gen, 'vehicles_created':self.vehicles_created,
+                'pending':self.pending}
+
+    def set_state(self, state):
+        #continue from a restored sim state, scheduled vehicles
+        #are part of the sumo state, only origin routes no
+        #vehicle uses any more may have to be added again
+        self.t = state['t']
+        self.stop_gen = state['stop_gen']
+        self.vehicles_created = state['vehicles_created']
+        self.pending = state['pending']
+        routes = set(self.conn.route.getIDList())
+        for origin in self.origins:
+            if origin not in routes:
+                self.conn.route.add(origin, [origin] )
+        if self.route_table:
+            self.route_table.add_routes(self.conn, routes)
+
     def gen_dynamic(self):
         ###get next set of edges from v schedule, use them to add new vehicles
         ###this is batch vehicle generation
@@ -70,94 +130,145 @@ class VehicleGen:
             print('no vehicles left')
         
     def gen_dynamic_sine(self):
+        start_time_routes = self.sine_schedule()
+        self.add_schedule(start_time_routes)
+        print(f'tatol vehicle number: {sum([len(start_time_routes[route]) for route in start_time_routes])}')
+            
+        self.stop_gen = True
+
+    def sine_schedule(self):
         # correct generating sine wave traffic cycle for both training and test
-        t = np.linspace(1*np.pi, 2*np.pi, self.sim_len)
-        sine = 5.1*np.sin(t)+6 # headway 0.9~6s, tf 4000~600vph
-        flow_rate_routes = []
-        flow_inputs = 3600/sine
         if self.mode=='test':
             random_shift=0
         elif self.mode=='train':
-            random_shift=np.random.randint(0, self.sim_len)
+            random_shift=self.rng.randint(0, self.sim_len)
         else:
             assert False, 'Wrong mode given to tflow_genders_sine'
-        flow_inputs = np.concatenate((flow_inputs[random_shift:], flow_inputs[:random_shift]))
-        flow_inputs[-60:] = 0
-        
-        demand_ratios = [0.5, 1.5, 1., 0.5, 1.5, 1., 0.5, 1.5, 1., 0.5, 1.5, 1.]
-        ratio_sum = sum(demand_ratios)
-        demand_ratios = [ratio/ratio_sum for ratio in demand_ratios]
-        for flow_input in flow_inputs:
-            flow_rate_routes.append([flow_input*ratio for ratio in demand_ratios])
-            
-        start_time_routes = {route:[] for route in self.routes}
-        for i in range(len(self.routes)):
-            route = self.routes[i]
-            t_generate = 0
-            while t_generate < len(flow_rate_routes):
-                if flow_rate_routes[t_generate][i] < F_RATES[0]:
-                    t_generate += 1
-                elif len(start_time_routes[route]) == 0:
-                    start_time_routes[route].append(t_generate + self.headway_j(flow_rate_routes[t_generate][i]))
-                    t_generate = int(round(start_time_routes[route][-1]))
-                else:
-                    start_time_routes[route].append(start_time_routes[route][-1] + self.headway_j(flow_rate_routes[t_generate][i]))
-                    t_generate = int(round(start_time_routes[route][-1]))
-                    
+        #flow rate of every route in every second
+        flow_rate_routes = sine_flow_rates(self.sim_len, len(self.routes), random_shift)
+        start_time_routes = self.headways.schedule(flow_rate_routes)
+        return {route:start_times.tolist() for route, start_times in zip(self.routes, start_time_routes)}
+
+    def add_schedule(self, start_time_routes):
+        if self.window > 0:
+            #vehicles are added by run as their departure nears
+            self.pending = self.schedule_departures(start_time_routes)
+            self.add_pending()
+            return
         for route in self.routes:
             [self.addVehicle(route, None, start_time) for start_time in start_time_routes[route]]
-        print(f'tatol vehicle number: {sum([len(start_time_routes[route]) for route in start_time_routes])}')
-            
-        self.stop_gen = True
+
+    def schedule_departures(self, start_time_routes):
+        """departure queue of a schedule, every route's departure
+        times sorted with the vehicle number add_schedule would give
+        them, and a heap of (next departure, route, position) over
+        the routes, vehicles are taken from it by pop_departures
+        """
+        departs, numbers, heap = [], [], []
+        for k, route in enumerate(self.routes):
+            d = np.asarray(start_time_routes[route], dtype=np.float64)
+            order = np.argsort(d, kind='stable')
+            departs.append(d[order])
+            numbers.append(self.vehicles_created + order)
+            self.vehicles_created += len(d)
+            if len(d) > 0:
+                heap.append((departs[k][0], k, 0))
+        heapq.heapify(heap)
+        return {'departs':departs, 'numbers':numbers, 'heap':heap}
+
+    def pop_departures(self, pending, end):
+        #(depart, vehicle id, route) of the queued vehicles departing
+        #before end by departure, ties in the order add_schedule adds them
+        departs, numbers, heap = pending['departs'], pending['numbers'], pending['heap']
+        while heap and heap[0][0] < end:
+            depart, k, j = heap[0]
+            route = self.routes[k]
+            if j+1 < len(departs[k]):
+                heapq.heapreplace(heap, (departs[k][j+1], k, j+1))
+            else:
+                heapq.heappop(heap)
+            yield float(depart), 'v_' + route + '_' + str(numbers[k][j]), route
+
+    def write_route_file(self, fp):
+        #sumo expects vehicles in route files sorted by departure
+        vehicles = self.pop_departures(self.schedule_departures(self.gen_schedule()), np.inf)
+        lines = ['<routes>']
+        lines += ['    <vehicle id="%s" route="%s" depart="%.3f" departLane="best"/>' % (v, route, depart) for depart, v, route in vehicles]
+        lines += ['</routes>']
+        write_lines_to_file(fp, 'w', lines)
+        print(f'tatol vehicle number: {len(lines)-2} written to {fp}')
+
+    def color_vehicles(self, vehicles):
+        #vehicles loaded from a route file get their route's colour on departure
+        if not self.compiled:
+            return
+        for v in vehicles:
+            route = v[2:v.rfind('_')]
+            if route in self.color_routes:
+                self.conn.vehicle.setColor(v, self.color_routes[route])
         
         
 #############################################################################
 
     def headway_j(self,flow_rate):
-        assert flow_rate >= F_RATES[0]/2, f'Input flow rate ({flow_rate}) should not be smaller than {F_RATES[0]/2}v/h for calculating the headway!'
-        #assert flow_rate <= F_RATES[-1], f'Input flow rate ({flow_rate}) should not be bigger than {F_RATES[-1]}v/h, the saturation rate of one lane!'
-        headway = {F_RATES[0]: lambda: johnsonsb.rvs(0.3, 1.8, loc=0.85, scale=130),
-                   F_RATES[1]: lambda: johnsonsb.rvs(0.9, 0.71, loc=0.85, scale=60), 
-                   F_RATES[2]: lambda: johnsonsb.rvs(2.49, 0.71, loc=0.85, scale=104.57), 
-                   F_RATES[3]: lambda: johnsonsb.rvs(3.71, 0.98, loc=0.85, scale=104.57), 
-                   F_RATES[4]: lambda: johnsonsu.rvs(-2.18, 1.15, loc=0.8, scale=0.52), 
-                   F_RATES[5]: lambda: johnsonsu.rvs(-2.54, 1.31, loc=0.47, scale=0.46), 
-                   F_RATES[6]: lambda: johnsonsu.rvs(-2.49, 1.49, loc=0.55, scale=0.49)}
-        if flow_rate <= F_RATES[0]:
-            result = min(900, headway[F_RATES[0]]() * F_RATES[0] / flow_rate) # headyway should be smaller than 900s, which is the normal measure period of traffic flow
-            return result
-        for i in range(1, len(F_RATES)):
-            if flow_rate <= F_RATES[i]:
-                ratio = (flow_rate-F_RATES[i-1])/(F_RATES[i]-F_RATES[i-1])
-                result = (1-ratio) * headway[F_RATES[i-1]]() + ratio * headway[F_RATES[i]]()
-                result = max(result, 0)
-                return result
-        result = max(headway[F_RATES[-1]]() * F_RATES[-1] / flow_rate, 0) # headyway should be bigger than 0
-        return result
+        return self.headways.sample([flow_rate])[0]
     
     def addVehicle(self, id_route, id_vehicle_type, time_depart, depart_speed='desired'): # the option 'desired' for departSpeed is only available since ubuntu 18.04, use 'max' for ubuntu version 16.04
         id_v = 'v_' + id_route + '_' + str(self.vehicles_created)	# !!! naming rule for vehicle id: v_<route id>_<vehicle id>
-        self.conn.vehicle.add(id_v, id_route, depart=time_depart, departLane="best")
         self.vehicles_created += 1
-        self.conn.vehicle.setColor(id_v, self.color_routes[id_route])
+        self.add_vehicle(id_v, id_route, time_depart)
+
+    def add_vehicle(self, id_v, id_route, time_depart):
+        self.conn.vehicle.add(id_v, id_route, depart=time_depart, departLane="best")
+        if self.gui:
+            self.conn.vehicle.setColor(id_v, self.color_routes[id_route])
     
     # only for test mode, not for training  
     def gen_fr_cycle(self, type):
-        v_gen_file = None
+        self.add_schedule(self.fr_schedule(type))
+        self.stop_gen = True
+
+    def gen_file_cycle(self, fp):
+        self.add_schedule(self.file_schedule(fp))
+        self.stop_gen = True
+
+    def fr_schedule(self, type):
+        v_gen_fp = None
         root_dir   = os.getcwd()
         if type == "linear":
-            
-            list_files = os.listdir(root_dir + "/tf_test/linear")
-            list_files = [item for item in list_files if item[-3:]=='.vg']
-            tf_level = list_files[0][:4]
-            v_gen_file = open(root_dir + "/tf_test/linear/" + tf_level + '_' + self.demand[-2:]+'.vg', 'rb')
+            #demand linear_<level>_<cycle> or linear_<cycle>, which
+            #takes the lowest flow level, the cycles of a level are
+            #tf_test/linear/<level>/<level>_<cycle>.vg
+            parts = self.demand.split('_')
+            if len(parts) == 3:
+                tf_level = parts[1]
+            else:
+                levels = [d for d in os.listdir(root_dir + "/tf_test/linear") if d.isdigit()]
+                assert levels, 'No flow level directories in tf_test/linear'
+                tf_level = min(levels, key=int)
+            v_gen_fp = root_dir + "/tf_test/linear/" + tf_level + "/" + tf_level + '_' + parts[-1] + '.vg'
             #tf_file = open("/home/yan/work_spaces/sumolights/tf_test/linear/" + np.random.choice(list_files), 'rb')
         elif type == "real":
-            v_gen_file = open(root_dir + "/tf_test/real/real.vg", 'rb')
+            v_gen_fp = root_dir + "/tf_test/real/real.vg"
         elif type == 'video':
-            v_gen_file = open(root_dir + "/tf_test/sat.vg", 'rb')
-            #v_gen_file = open(root_dir + "/tf_test/linear/3000/3000_05.vg", 'rb')
-        start_time_routes = pk.load(v_gen_file)
+            v_gen_fp = root_dir + "/tf_test/sat.vg"
+            #v_gen_fp = root_dir + "/tf_test/linear/3000/3000_05.vg"
+        return self.file_schedule(v_gen_fp)
+
+    def file_schedule(self, v_gen_fp):
+        #compact .npy schedules are memory mapped, a .vg pickle
+        #is replaced by the compact schedule gen_demand.py wrote
+        #next to it if there is one
+        v_gen_file = v_gen_fp if v_gen_fp[-4:] == '.npy' else schedule_fp(v_gen_fp)
+        if os.path.isfile(v_gen_file):
+            start_time_routes = load_schedule(v_gen_file)
+        else:
+            v_gen_file = v_gen_fp
+            assert os.path.isfile(v_gen_file), 'Vehicle schedule '+str(v_gen_file)+' does not exist'
+            with open(v_gen_fp, 'rb') as f:
+                start_time_routes = pk.load(f)
+        missing = [route for route in self.routes if route not in start_time_routes]
+        assert not missing, 'Vehicle schedule '+str(v_gen_file)+' has no departures for routes '+str(missing)
         print(f'################# v_gen_file is:\n {v_gen_file}')
         print(f'@@@@@@@@@@@@@ vehilce amount is: \n{sum([len(start_time_routes[key]) for key in start_time_routes])}')
         print(f'$$$$$$$$$$$$$ routs are:\n{self.routes}')
@@ -175,10 +286,7 @@ class VehicleGen:
                     self.start_time_routes[route].append(self.start_time_routes[route][-1] + self.headway_j(flow_rate_routes[t_generate][i]))
                     t_generate = int(round(self.start_time_routes[route][-1]))
         '''
-        
-        for route in self.routes:
-            [self.addVehicle(route, None, start_time) for start_time in start_time_routes[route]]
-        self.stop_gen = True
+        return start_time_routes
         
     def gen_linear_cycle(self):
         self.gen_fr_cycle("linear")
@@ -197,30 +305,28 @@ class VehicleGen:
         ###use sine wave as rate parameter for dynamic traffic demand
         t = np.linspace(1*np.pi, 2*np.pi, self.sim_len)                                          
         sine = np.sin(t)+1.55
-        ###create schedule for number of vehicles to be generated each second in sim
-        v_schedule = []
-        second = 1.0
-        for t in range(int(self.sim_len)):
-            n_veh = 0.0
-            while second > 0.0:
-                headway = np.random.exponential( sine[t], size=1)
-                second -= headway
-                if second > 0.0:
-                    n_veh += 1
-            second += 1.0
-            v_schedule.append(int(n_veh))
+        ###create schedule for number of vehicles to be generated each second in sim,
+        ###arrivals with exponential headways of mean sine[t] in second t are unit rate
+        ###arrivals on the time scale where second t lasts 1/sine[t]
+        scaled_t = np.concatenate(([0.0], np.cumsum(1.0/sine[:int(self.sim_len)])))
+        total = scaled_t[-1]
+        arrivals = np.cumsum(self.rng.exponential(1.0, size=int(total+5*np.sqrt(total)+10)))
+        while arrivals[-1] <= total:
+            extra = np.cumsum(self.rng.exponential(1.0, size=int(np.sqrt(total)+10)))
+            arrivals = np.concatenate((arrivals, arrivals[-1]+extra))
+        n_arrived = np.searchsorted(arrivals, scaled_t, side='right')
+        v_schedule = np.diff(n_arrived)
                                                                                             
         ###randomly shift traffic pattern as a form of data augmentation
-        v_schedule = np.array(v_schedule)
         if mode == 'test':
             random_shift = 0
         else:
-            random_shift = np.random.randint(0, self.sim_len)
+            random_shift = self.rng.randint(0, self.sim_len)
         v_schedule = np.concatenate((v_schedule[random_shift:], v_schedule[:random_shift]))
         ###zero out the last minute for better comparisons because of random shift
         v_schedule[-60:] = 0
         ###randomly select from origins, these are where vehicles are generated
-        v_schedule = [ np.random.choice(self.origins, size=int(self.scale*n_veh), replace = True) 
+        v_schedule = [ self.rng.choice(self.origins, size=int(self.scale*n_veh), replace = True) 
                        if n_veh > 0 else [] for n_veh in v_schedule  ]
         print(f'@@@@@@@@@@@@@@@@@@@@@@@@@@@@@ v number is:\n{sum([len(item) for item in v_schedule])}')
         ###fancy iterator, just so we can call next for sequential access
@@ -233,21 +339,24 @@ class VehicleGen:
     def gen_single(self):
         if self.conn.vehicle.getIDCount() == 0:
             ###if no vehicles in sim, spawn 1 on random link
-            veh_spawn_edge = np.random.choice(self.origins)
+            veh_spawn_edge = self.rng.choice(self.origins)
             self.gen_veh( [veh_spawn_edge] )
 
     def gen_veh( self, veh_edges ):
         for e in veh_edges:
             vid = e+str(self.vehicles_created)
-            self.conn.vehicle.addFull( vid, e, departLane="best" )
-            self.set_veh_route(vid)
+            if self.route_table and self.route_table.has_routes(e):
+                self.conn.vehicle.add( vid, self.route_table.sample(e, self.rng), departLane="best" )
+            else:
+                self.conn.vehicle.addFull( vid, e, departLane="best" )
+                self.set_veh_route(vid)
             self.vehicles_created += 1
 
     def set_veh_route(self, veh):
         current_edge = self.conn.vehicle.getRoute(veh)[0]
         route = [current_edge]
         while current_edge not in self.destinations:
-            next_edge = np.random.choice(self.netdata['edge'][current_edge]['outgoing'])
+            next_edge = self.rng.choice(self.netdata['compact'].edge_outgoing(current_edge))
             route.append(next_edge)
             current_edge = next_edge
         self.conn.vehicle.setRoute( veh, route )    
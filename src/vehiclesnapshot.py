@@ -0,0 +1,102 @@
+import numpy as np
+
+#vehicle variable columns a snapshot can have, lane position (m),
+#speed (m/s), accumulated waiting time (s) and co2 emission (mg/s)
+COLUMNS = ['pos', 'speed', 'wait', 'co2']
+
+class VehicleSnapshot:
+    """Columnar snapshot of the subscribed vehicles in one sim step.
+
+    Vehicles are stored as contiguous arrays sorted by lane index,
+    so the vehicles of lane i are the slice offsets[i]:offsets[i+1]
+    of every column. Only the columns some controller or metric
+    needs are subscribed, the others are None.
+    """
+    def __init__(self, lane, vid, n_lanes, columns):
+        order = np.argsort(lane, kind='stable')
+        self.lane = lane[order]
+        self.vid = vid[order]
+        for name in COLUMNS:
+            setattr(self, name, columns[name][order] if name in columns else None)
+        self.counts = np.bincount(self.lane, minlength=n_lanes)
+        self.offsets = np.zeros(n_lanes+1, dtype=np.int64)
+        np.cumsum(self.counts, out=self.offsets[1:])
+        self.queues = {}
+        self.sums = {}
+        #lane changes since the previous snapshot, see track_changes
+        self.entered = None
+        self.left_vid = None
+        self.left_lane = None
+        self.left_offsets = None
+
+    def lane_slice(self, i):
+        return slice(self.offsets[i], self.offsets[i+1])
+
+    def ids(self, i):
+        #interned vehicle ids on lane i
+        return self.vid[self.offsets[i]:self.offsets[i+1]]
+
+    def lanes_ids(self, lanes):
+        #interned vehicle ids on several lanes
+        if len(lanes) == 0:
+            return self.vid[:0]
+        return np.concatenate([self.ids(i) for i in lanes])
+
+    def lane_queues(self, stop_speed):
+        #number of stopped vehicles on every lane,
+        #computed once per step for each stop speed
+        if stop_speed not in self.queues:
+            self.queues[stop_speed] = np.bincount(self.lane,
+                                                  weights=self.speed < stop_speed,
+                                                  minlength=len(self.counts))
+        return self.queues[stop_speed]
+
+    def lane_sums(self, name):
+        #sum of a column over the vehicles on every lane
+        if name not in self.sums:
+            assert getattr(self, name) is not None, 'Vehicle snapshot column '+str(name)+' is not subscribed'
+            self.sums[name] = np.bincount(self.lane, weights=getattr(self, name), minlength=len(self.counts))
+        return self.sums[name]
+
+    def track_changes(self, prev, v_lane):
+        """find the vehicles that entered or left a lane since the
+        previous snapshot, v_lane holds the lane of every interned
+        vehicle in prev, -1 if on none, and is updated to this snapshot
+        """
+        #rows of vehicles that were not on their lane in prev
+        self.entered = v_lane[self.vid] != self.lane
+        if prev is not None:
+            v_lane[prev.vid] = -1
+        v_lane[self.vid] = self.lane
+        if prev is None:
+            self.left_vid = self.vid[:0]
+            self.left_lane = self.lane[:0]
+            self.left_offsets = np.zeros(len(self.offsets), dtype=np.int64)
+            return
+        #vehicles of prev no longer on their lane, still sorted by lane
+        left = v_lane[prev.vid] != prev.lane
+        self.left_vid = prev.vid[left]
+        self.left_lane = prev.lane[left]
+        self.left_offsets = np.zeros(len(self.offsets), dtype=np.int64)
+        np.cumsum(np.bincount(prev.lane[left], minlength=len(self.counts)), out=self.left_offsets[1:])
+
+    def lanes_entered(self, lanes):
+        #interned ids and lanes of the vehicles that entered several lanes
+        rows = gather_rows(self.offsets, lanes)
+        rows = rows[self.entered[rows]]
+        return self.vid[rows], self.lane[rows]
+
+    def lanes_left(self, lanes):
+        #interned ids of the vehicles that left several lanes
+        return self.left_vid[gather_rows(self.left_offsets, lanes)]
+
+def gather_rows(offsets, lanes):
+    #rows offsets[i]:offsets[i+1] of every lane i in lanes
+    starts = offsets[lanes]
+    counts = offsets[np.asarray(lanes)+1]-starts
+    n = counts.sum()
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    #row k of the result is its lane's start plus its rank in the lane
+    ends = np.cumsum(counts)
+    return np.repeat(starts-(ends-counts), counts)+np.arange(n)